@@ -0,0 +1,100 @@
+"""Compara os modos de inferência do carregararctic: tempo de carga, memória e tokens/s.
+
+Cada modo roda em um processo separado, para que a memória medida seja só a dele.
+Com ARCTIC_QUANTIZED_CACHE ligado, o cpu-int8 roda duas vezes: a primeira
+quantiza e grava o cache (se ele ainda não existir) e a segunda carrega do
+cache, marcada como "cpu-int8 (cache)".
+
+Uso:
+    python benchmarks/bench_arctic_backends.py [--modes cpu-int8,cpu-fp32] [--new-tokens 64]
+
+Para um teste rápido, use um modelo pequeno:
+    ARCTIC_MODEL_NAME=<modelo pequeno> ARCTIC_USE_AUTH_TOKEN=0 python benchmarks/bench_arctic_backends.py
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_MODES = "cpu-int8,cpu-bf16,cpu-fp32"
+PROMPT = "quais carros da Toyota custam menos de 100 mil reais"
+
+
+def measure(new_tokens: int, runs: int) -> dict:
+    """Roda no processo filho: carrega o modelo no modo de ARCTIC_BACKEND e gera tokens."""
+    import torch
+    import carregararctic
+
+    cache_hit = (carregararctic.resolve_backend() == "cpu-int8" and bool(carregararctic.quantized_cache_dir)
+                 and os.path.exists(carregararctic.quantized_cache_path()))
+    start = time.perf_counter()
+    tokenizer, model = carregararctic.load_model()
+    load_s = time.perf_counter() - start
+
+    inputs = tokenizer(carregararctic.build_prompt(PROMPT), return_tensors="pt").to(model.device)
+    with torch.inference_mode():
+        # Aquecimento, fora da medição
+        model.generate(**inputs, max_new_tokens=4, min_new_tokens=4, pad_token_id=tokenizer.pad_token_id)
+        elapsed = 0.0
+        for _ in range(runs):
+            start = time.perf_counter()
+            # min_new_tokens força o mesmo número de tokens em todos os modos
+            model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                           pad_token_id=tokenizer.pad_token_id)
+            elapsed += time.perf_counter() - start
+
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+    return {
+        "mode": carregararctic.resolve_backend(),
+        "cache_hit": cache_hit,
+        "load_s": load_s,
+        "max_rss_mb": max_rss_mb,
+        "tokens_per_s": new_tokens * runs / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=DEFAULT_MODES)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.new_tokens, args.runs)))
+        return
+
+    import carregararctic
+
+    print(f"{'modo':<18} {'carga (s)':>10} {'memória (MB)':>13} {'tokens/s':>9}")
+    runs = []
+    for mode in args.modes.split(","):
+        runs.append(mode)
+        if mode == "cpu-int8" and carregararctic.quantized_cache_dir:
+            runs.append(mode)
+    for mode in runs:
+        env = dict(os.environ, ARCTIC_BACKEND=mode)
+        command = [sys.executable, os.path.abspath(__file__), "--child",
+                   "--new-tokens", str(args.new_tokens), "--runs", str(args.runs)]
+        completed = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{mode:<18} falhou: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        label = mode if result["mode"] == mode else f"{mode}->{result['mode']}"
+        if result["cache_hit"]:
+            label += " (cache)"
+        print(f"{label:<18} {result['load_s']:>10.1f} {result['max_rss_mb']:>13.0f} {result['tokens_per_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Benchmark de get_cars_filtered: consulta SQL (SQLite + índices) x snapshot colunar (columnar.py).
+
+Usa os mesmos bancos sintéticos de bench_endpoints.py (10 mil, 1 milhão e 10
+milhões de carros, em benchmarks/data/). Para cada tamanho mede a carga do
+snapshot, a memória das colunas, o custo de acompanhar o banco (refresh sem
+carros novos e com 1000 carros novos) e, para cada combinação de filtros, as
+latências dos dois caminhos. As respostas são conferidas: a sequência de
+notas tem que ser a mesma nos dois caminhos.
+
+Uso:
+    python benchmarks/bench_columnar.py [--sizes 10k,1m,10m] [--queries 200] [--output resultados.json]
+
+Os carros inseridos para medir o refresh são removidos ao final.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_endpoints import BRANDS, RESULTS_DIR, build_dataset, git_commit, parse_size, percentile, synthetic_cars
+
+# Quantidade de carros inseridos para medir o refresh incremental
+REFRESH_ROWS = 1000
+
+
+def shapes() -> dict:
+    """Combinações de filtros medidas: nome -> função(rng) que devolve os argumentos de get_cars_filtered."""
+    def years(rng):
+        return f"{rng.randint(1990, 2020)}-01-01", f"{rng.randint(2021, 2025)}-12-31"
+
+    return {
+        "brand_min_rating": lambda rng: (rng.choice(BRANDS), None, None, 4.0, 10),
+        "dates": lambda rng: (None, *years(rng), None, 10),
+        "brand_dates_rating": lambda rng: (rng.choice(BRANDS), "2000-01-01", "2010-12-31", 3.0, 10),
+        "min_rating": lambda rng: (None, None, None, round(rng.uniform(0, 4.9), 1), 10),
+        "no_filter": lambda rng: (None, None, None, None, 10),
+    }
+
+
+def summarize(latencies: list) -> dict:
+    latencies.sort()
+    return {
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def run_size(rows: int, queries: int) -> dict:
+    import database
+    import server
+    from columnar import ColumnarSnapshot, routes_to_columnar
+
+    conn = database.connect(build_dataset(rows))
+    database.migrate(conn)
+    last_id = conn.execute("SELECT MAX(id) FROM cars").fetchone()[0]
+    snapshot = ColumnarSnapshot()
+    result = {}
+    try:
+        start = time.perf_counter()
+        snapshot.refresh(conn)
+        result["load_s"] = time.perf_counter() - start
+        result["memory_mb"] = snapshot.memory_bytes() / 2**20
+
+        start = time.perf_counter()
+        snapshot.refresh(conn)
+        result["refresh_idle_ms"] = (time.perf_counter() - start) * 1000
+        with conn:
+            conn.executemany(
+                "INSERT INTO cars (brand, model, price, rating, launch_date) VALUES (?, ?, ?, ?, ?)",
+                synthetic_cars(REFRESH_ROWS, seed=7),
+            )
+        start = time.perf_counter()
+        snapshot.refresh(conn)
+        result[f"refresh_{REFRESH_ROWS}_new_ms"] = (time.perf_counter() - start) * 1000
+
+        result["queries"] = {}
+        for name, make_args in shapes().items():
+            rng = random.Random(name)
+            sql_latencies, columnar_latencies = [], []
+            mismatches = 0
+            for _ in range(queries):
+                args = make_args(rng)
+                start = time.perf_counter()
+                query, params = server._filtered_query(*args)
+                expected = server._car_dicts(conn.execute(query, params).fetchall())
+                sql_latencies.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                cars = snapshot.filtered(conn, *args)
+                columnar_latencies.append((time.perf_counter() - start) * 1000)
+                # Empates de nota podem vir em outra ordem; a sequência de notas não
+                if cars is None or [car["rating"] for car in cars] != [car["rating"] for car in expected]:
+                    mismatches += 1
+            sql, columnar = summarize(sql_latencies), summarize(columnar_latencies)
+            result["queries"][name] = {
+                "routed": routes_to_columnar(*make_args(random.Random(0))[:3]),
+                "sql": sql,
+                "columnar": columnar,
+                "speedup_p50": sql["p50_ms"] / columnar["p50_ms"],
+                "mismatches": mismatches,
+            }
+    finally:
+        with conn:
+            conn.execute("DELETE FROM cars WHERE id > ?", (last_id,))
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'cars'", (last_id,))
+        conn.close()
+    return result
+
+
+def print_results(rows: int, result: dict):
+    print(f"\n{rows} carros: carga {result['load_s']:.2f} s, {result['memory_mb']:.0f} MB; refresh sem novos "
+          f"{result['refresh_idle_ms']:.2f} ms, com {REFRESH_ROWS} novos {result[f'refresh_{REFRESH_ROWS}_new_ms']:.2f} ms")
+    print(f"{'filtros':<20} {'SQL p50':>9} {'SQL p95':>9} {'col. p50':>9} {'col. p95':>9} {'ganho p50':>10} {'difer.':>7}  rota")
+    for name, item in result["queries"].items():
+        print(f"{name:<20} {item['sql']['p50_ms']:>9.2f} {item['sql']['p95_ms']:>9.2f} "
+              f"{item['columnar']['p50_ms']:>9.2f} {item['columnar']['p95_ms']:>9.2f} "
+              f"{item['speedup_p50']:>9.1f}x {item['mismatches']:>7}  {'colunar' if item['routed'] else 'SQL'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,1m,10m")
+    parser.add_argument("--queries", type=int, default=200, help="consultas por combinação de filtros")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: benchmarks/results/columnar-<data>.json)")
+    args = parser.parse_args()
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "parameters": {"queries": args.queries},
+        "results": {},
+    }
+    for size in args.sizes.split(","):
+        rows = parse_size(size)
+        result = run_size(rows, args.queries)
+        report["results"][str(rows)] = result
+        print_results(rows, result)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"columnar-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\nResultados salvos em {output}")
+
+
+if __name__ == "__main__":
+    main()
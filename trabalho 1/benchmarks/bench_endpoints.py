@@ -0,0 +1,310 @@
+"""Benchmark das rotas HTTP do servidor sobre bancos sintéticos de 10 mil, 1 milhão e 10 milhões de carros.
+
+As requisições passam pelo test client do Flask, no mesmo processo (sem rede),
+então o resultado mede as rotas, o SQLite e a serialização JSON. Cada tamanho
+de banco roda em um processo separado, com CARS_DB_PATH apontando para ele.
+
+Uso:
+    python benchmarks/bench_endpoints.py [--sizes 10k,1m,10m] [--seconds 2] [--output resultados.json]
+
+    # Compara com uma execução anterior; sai com código 1 se alguma rota piorar
+    python benchmarks/bench_endpoints.py --sizes 10k --compare benchmarks/results/endpoints-baseline.json
+
+Os bancos ficam em benchmarks/data/ e são reaproveitados entre execuções.
+As escritas feitas pelo benchmark são desfeitas ao final de cada tamanho.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+BRANDS = ["Toyota", "Honda", "Chevrolet", "Volkswagen", "Fiat", "Ford", "Hyundai", "Renault",
+          "Nissan", "Jeep", "Peugeot", "Citroen", "Kia", "Mitsubishi", "BMW", "Audi"]
+MODELS_PER_BRAND = 25
+GENERATE_CHUNK = 100000
+
+# Piora relativa do p95 tolerada por --compare antes de apontar regressão (0.20 = 20%)
+DEFAULT_TOLERANCE = 0.20
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def synthetic_cars(count: int, seed: int = 42):
+    """Gera (brand, model, price, rating, launch_date) determinísticos."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        brand = rng.choice(BRANDS)
+        yield (
+            brand,
+            f"{brand[:3]}-{rng.randrange(MODELS_PER_BRAND):02d}",
+            round(rng.uniform(30000, 400000), 2),
+            round(rng.uniform(0, 5), 1),
+            f"{rng.randint(1990, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        )
+
+
+def dataset_path(rows: int) -> str:
+    return os.path.join(DATA_DIR, f"cars_{rows}.db")
+
+
+def build_dataset(rows: int) -> str:
+    """Cria (ou reaproveita) o banco sintético com rows carros."""
+    import database
+
+    path = dataset_path(rows)
+    if os.path.exists(path):
+        conn = database.connect(path)
+        try:
+            # Migrações novas são aplicadas pelo init_db do processo filho
+            ready = conn.execute("SELECT MAX(id) FROM cars").fetchone()[0] == rows
+        except sqlite3.Error:
+            ready = False
+        finally:
+            conn.close()
+        if ready:
+            return path
+        os.remove(path)
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    start = time.perf_counter()
+    conn = database.connect(path)
+    database.migrate(conn)
+    with database.bulk_load(conn):
+        cars = synthetic_cars(rows)
+        while True:
+            chunk = [car for _, car in zip(range(GENERATE_CHUNK), cars)]
+            if not chunk:
+                break
+            conn.executemany(
+                "INSERT INTO cars (brand, model, price, rating, launch_date) VALUES (?, ?, ?, ?, ?)", chunk
+            )
+            conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    print(f"Banco com {rows} carros criado em {time.perf_counter() - start:.1f} s: {path}")
+    return path
+
+
+def scenarios(rows: int) -> dict:
+    """Rotas medidas: nome -> função(rng) que devolve (método, caminho, corpo JSON)."""
+    def brand(rng):
+        return rng.choice(BRANDS)
+
+    def model(rng):
+        name = brand(rng)
+        return f"{name[:3]}-{rng.randrange(MODELS_PER_BRAND):02d}"
+
+    def car(rng):
+        return {"brand": brand(rng), "model": model(rng), "price": 50000.0, "rating": 4.0}
+
+    return {
+        "get_cars_by_brand": lambda rng: ("GET", f"/get_cars_by_brand?brand={brand(rng)}", None),
+        "get_cars_by_model": lambda rng: ("GET", f"/get_cars_by_model?model={model(rng)}", None),
+        "get_all_cars_page": lambda rng: ("GET", f"/get_all_cars?limit=100&after_id={rng.randrange(rows)}", None),
+        "get_cars_filtered_brand": lambda rng: (
+            "GET", f"/get_cars_filtered?brand={brand(rng)}&min_rating=4&limit=10", None),
+        "get_cars_filtered_dates": lambda rng: (
+            "GET", f"/get_cars_filtered?start_date={rng.randint(1990, 2020)}-01-01"
+                   f"&end_date={rng.randint(2021, 2025)}-12-31&limit=10", None),
+        "get_cars_filtered_all": lambda rng: (
+            "GET", f"/get_cars_filtered?brand={brand(rng)}&start_date=2000-01-01&end_date=2010-12-31"
+                   "&min_rating=3&limit=10", None),
+        "brand_stats": lambda rng: ("GET", "/brand_stats", None),
+        "top_cars_per_brand": lambda rng: ("GET", "/top_cars_per_brand?k=3", None),
+        "search_cars": lambda rng: ("GET", f"/search_cars?q={model(rng).replace('-', ' ')}&limit=10", None),
+        "cache_stats": lambda rng: ("GET", "/cache_stats", None),
+        "add_car": lambda rng: ("POST", "/add_car", car(rng)),
+        "add_car_with_date": lambda rng: ("POST", "/add_car_with_date", dict(car(rng), launch_date="2024-01-01")),
+        "add_cars_batch_100": lambda rng: ("POST", "/add_cars_batch", [car(rng) for _ in range(100)]),
+    }
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(app, make_request, seconds: float, max_requests: int, concurrency: int) -> dict:
+    """Dispara a rota por até seconds segundos (ou max_requests requisições) e resume as latências."""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed: int):
+        nonlocal errors
+        client = app.test_client()
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            with lock:
+                if len(latencies) + errors >= max_requests:
+                    return
+            method, path, body = make_request(rng)
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def run_child(rows: int, seconds: float, max_requests: int, concurrency: int, only: list) -> dict:
+    """Roda no processo filho, com CARS_DB_PATH já apontando para o banco."""
+    import server
+    from database import pool
+
+    server.init_db()
+    with pool.connection() as conn:
+        last_id = conn.execute("SELECT MAX(id) FROM cars").fetchone()[0]
+
+    results = {}
+    try:
+        for name, make_request in scenarios(rows).items():
+            if only and name not in only:
+                continue
+            results[name] = measure(server.app, make_request, seconds, max_requests, concurrency)
+    finally:
+        # Desfaz as escritas do benchmark (os gatilhos acertam os resumos)
+        with pool.connection() as conn, conn:
+            conn.execute("DELETE FROM cars WHERE id > ?", (last_id,))
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'cars'", (last_id,))
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_results(rows: int, results: dict):
+    print(f"\n{rows} carros")
+    print(f"{'rota':<26} {'req/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'erros':>6}")
+    for name, result in results.items():
+        if not result["requests"]:
+            print(f"{name:<26} {'-':>9} {'-':>9} {'-':>9} {'-':>9} {result['errors']:>6}")
+            continue
+        print(f"{name:<26} {result['throughput']:>9.1f} {result['p50_ms']:>9.2f} "
+              f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>6}")
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """Lista as rotas cujo p95 piorou mais que tolerance em relação à execução de base."""
+    regressions = []
+    print(f"\nComparação com {baseline.get('commit') or 'a execução de base'} (p95)")
+    print(f"{'tamanho':>9} {'rota':<26} {'antes':>9} {'agora':>9} {'variação':>9}")
+    for size, routes in current["results"].items():
+        for name, result in routes.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if not before or not before.get("requests") or not result.get("requests"):
+                continue
+            change = result["p95_ms"] / before["p95_ms"] - 1
+            flag = "  <- regressão" if change > tolerance else ""
+            print(f"{size:>9} {name:<26} {before['p95_ms']:>9.2f} {result['p95_ms']:>9.2f} {change:>+9.0%}{flag}")
+            if flag:
+                regressions.append((size, name, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,1m,10m")
+    parser.add_argument("--seconds", type=float, default=2.0, help="tempo máximo por rota")
+    parser.add_argument("--max-requests", type=int, default=2000, help="requisições máximas por rota")
+    parser.add_argument("--concurrency", type=int, default=1, help="threads disparando requisições")
+    parser.add_argument("--routes", default="", help="mede só estas rotas (separadas por vírgula)")
+    parser.add_argument("--cache", action="store_true",
+                        help="mantém o cache de consultas ligado (por padrão mede o custo real das consultas)")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: benchmarks/results/endpoints-<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    only = [name for name in args.routes.split(",") if name]
+
+    if args.child is not None:
+        results = run_child(args.child, args.seconds, args.max_requests, args.concurrency, only)
+        print(json.dumps(results))
+        return
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "parameters": {"seconds": args.seconds, "max_requests": args.max_requests,
+                       "concurrency": args.concurrency, "cache": args.cache},
+        "results": {},
+    }
+    for size in args.sizes.split(","):
+        rows = parse_size(size)
+        path = build_dataset(rows)
+        env = dict(os.environ, CARS_DB_PATH=path, CARS_CACHE_ENABLED="1" if args.cache else "0")
+        command = [sys.executable, os.path.abspath(__file__), "--child", str(rows),
+                   "--seconds", str(args.seconds), "--max-requests", str(args.max_requests),
+                   "--concurrency", str(args.concurrency), "--routes", args.routes]
+        completed = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{rows} carros: falhou\n{completed.stderr.strip()}")
+            continue
+        results = json.loads(completed.stdout.strip().splitlines()[-1])
+        report["results"][str(rows)] = results
+        print_results(rows, results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"endpoints-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\nResultados salvos em {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Compara a latência por imagem dos backends de OCR (tesserocr x pytesseract).
+
+Mede cada backend de duas formas: a chamada de OCR sozinha, na imagem
+inteira já binarizada, e o ImagePipeline completo em três modos: imagem
+inteira (sem recorte de regiões), uma chamada de OCR por região e as
+regiões empilhadas em uma única chamada.
+
+Uso:
+    python benchmarks/bench_ocr.py [imagem ...] [--repeat N]
+
+Sem imagens, gera um anúncio sintético pequeno com OpenCV.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processing import OCR_BACKENDS, ImagePipeline  # noqa: E402
+
+
+def synthetic_listing() -> np.ndarray:
+    """Cria uma imagem pequena com texto no formato dos anúncios."""
+    image = np.full((220, 640), 255, dtype=np.uint8)
+    lines = ["Marca: Toyota", "Modelo: Corolla", "Preco: R$ 80000", "Nota: 4.5"]
+    for i, line in enumerate(lines):
+        cv2.putText(image, line, (20, 45 + 50 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2)
+    return image
+
+
+def load_images(paths: list) -> list:
+    """Imagens em tons de cinza, como o pipeline as recebe depois da decodificação."""
+    images = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise SystemExit(f"Imagem não pôde ser carregada: {path}")
+        images.append(image)
+    return images or [synthetic_listing()]
+
+
+class CountingBackend:
+    """Repassa as chamadas a um backend, contando-as e escolhendo se as regiões vão empilhadas."""
+
+    def __init__(self, backend, stack_regions: bool):
+        self.backend = backend
+        self.stack_regions = stack_regions
+        self.calls = 0
+
+    def image_to_string(self, image: np.ndarray) -> str:
+        self.calls += 1
+        return self.backend.image_to_string(image)
+
+
+# Modo do pipeline -> (recorta regiões, empilha regiões)
+PIPELINE_MODES = {
+    "imagem inteira": (False, False),
+    "por região": (True, False),
+    "empilhadas": (True, True),
+}
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_backend(name: str, images: list, repeat: int) -> dict:
+    start = time.perf_counter()
+    backend = OCR_BACKENDS[name]()
+    init_ms = (time.perf_counter() - start) * 1000
+
+    binarized = [cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1] for image in images]
+    latencies = []
+    for _ in range(repeat):
+        for image in binarized:
+            start = time.perf_counter()
+            backend.image_to_string(image)
+            latencies.append((time.perf_counter() - start) * 1000)
+    result = {
+        "backend": name,
+        "init_ms": init_ms,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "calls": len(latencies),
+        "pipeline": {},
+    }
+
+    for mode, (crop_regions, stack_regions) in PIPELINE_MODES.items():
+        pipeline = ImagePipeline(crop_regions=crop_regions)
+        counting = CountingBackend(backend, stack_regions)
+        latencies = []
+        for _ in range(repeat):
+            for image in images:
+                start = time.perf_counter()
+                pipeline.run(image, backend=counting)
+                latencies.append((time.perf_counter() - start) * 1000)
+        result["pipeline"][mode] = {
+            "mean_ms": statistics.mean(latencies),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "ocr_calls_per_image": counting.calls / len(latencies),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    results = []
+    print(f"{'backend':<12} {'init (ms)':>10} {'média (ms)':>11} {'p50 (ms)':>9} {'p95 (ms)':>9} {'chamadas':>9}")
+    for name in OCR_BACKENDS:
+        try:
+            result = bench_backend(name, images, args.repeat)
+        except (ImportError, RuntimeError, OSError) as e:
+            print(f"{name:<12} indisponível: {e}")
+            continue
+        results.append(result)
+        print(f"{result['backend']:<12} {result['init_ms']:>10.1f} {result['mean_ms']:>11.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['calls']:>9}")
+
+    if results:
+        print("\nPipeline completo por imagem:")
+        print(f"{'backend':<12} {'modo':<15} {'média (ms)':>11} {'p50 (ms)':>9} {'p95 (ms)':>9} {'OCR/imagem':>11}")
+    for result in results:
+        for mode, timing in result["pipeline"].items():
+            print(f"{result['backend']:<12} {mode:<15} {timing['mean_ms']:>11.1f} {timing['p50_ms']:>9.1f} "
+                  f"{timing['p95_ms']:>9.1f} {timing['ocr_calls_per_image']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Teste de carga: servidor de desenvolvimento (server.py) x modo de produção (serve.py).
+
+Cria um banco temporário com carros sintéticos, sobe cada modo em um
+processo separado na porta 8000 e dispara requisições GET concorrentes
+por um tempo fixo, medindo requisições/s e latências.
+
+Uso:
+    python benchmarks/bench_server_load.py [--modes dev,serve,serve-4] [--concurrency 64] [--seconds 10]
+    python benchmarks/bench_server_load.py --output benchmarks/results/server_load.json
+
+Modos: 'dev' roda server.py (app.run); 'serve' roda serve.py (gunicorn) com
+1 processo; 'serve-N' roda serve.py com N processos. As threads por processo
+vêm de CARS_SERVER_THREADS, como no servidor.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+URL = "http://127.0.0.1:8000"
+BRANDS = ["Toyota", "Honda", "Nissan", "Ford", "Fiat", "Chevrolet", "Volkswagen", "Hyundai"]
+
+
+def create_database(path: str, cars: int):
+    """Cria o banco com o esquema atual e carros sintéticos."""
+    import database
+
+    conn = database.connect(path)
+    database.migrate(conn)
+    rows = (
+        (BRANDS[i % len(BRANDS)], f"Modelo {i % 500}", 30000 + (i * 37) % 170000,
+         round((i * 7) % 51 / 10, 1), f"{2000 + i % 25}-{1 + i % 12:02d}-01")
+        for i in range(cars)
+    )
+    with conn:
+        conn.executemany(
+            "INSERT INTO cars (brand, model, price, rating, launch_date) VALUES (?, ?, ?, ?, ?)", rows
+        )
+    conn.close()
+
+
+def request_paths() -> list:
+    """Mistura de leituras típicas do chatbot."""
+    paths = []
+    for brand in BRANDS:
+        paths.append(f"/get_cars_filtered?brand={brand}&min_rating=4&limit=10")
+        paths.append(f"/get_cars_filtered?brand={brand}&start_date=2010-01-01&end_date=2020-12-31&limit=10")
+        paths.append(f"/get_cars_by_model?model=Modelo {BRANDS.index(brand)}")
+    paths.append("/get_all_cars?limit=100")
+    return paths
+
+
+def start_server(mode: str, db_path: str) -> subprocess.Popen:
+    env = dict(os.environ, CARS_DB_PATH=db_path, CARS_SERVER_PORT="8000", CARS_SERVER_HOST="127.0.0.1")
+    if mode == "dev":
+        command = [sys.executable, "server.py"]
+    else:
+        workers = mode.partition("-")[2] or "1"
+        env["CARS_SERVER_WORKERS"] = workers
+        command = [sys.executable, "serve.py"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Servidor no modo {mode} terminou ao iniciar (código {process.returncode})")
+        try:
+            if httpx.get(f"{URL}/cache_stats", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Servidor no modo {mode} não respondeu em 60 s")
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def load(concurrency: int, seconds: float) -> dict:
+    paths = request_paths()
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client(http: httpx.AsyncClient, seed: int):
+        nonlocal errors
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await http.get(rng.choice(paths))
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=URL, limits=limits, timeout=30) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(fraction: float) -> float:
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="dev,serve,serve-4")
+    parser.add_argument("--cars", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--output", help="salva os resultados em JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cars.db")
+        create_database(db_path, args.cars)
+
+        print(f"{'modo':<8} {'req/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'erros':>6}")
+        for mode in args.modes.split(","):
+            process = start_server(mode, db_path)
+            try:
+                # Aquecimento: conexões, page cache e cache de consultas
+                asyncio.run(load(args.concurrency, 1))
+                result = asyncio.run(load(args.concurrency, args.seconds))
+            finally:
+                stop_server(process)
+            result["mode"] = mode
+            results.append(result)
+            print(f"{mode:<8} {result['requests_per_s']:>9.1f} {result['p50_ms']:>9.1f} "
+                  f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['errors']:>6}")
+
+    if args.output:
+        from database import POOL_SIZE
+
+        report = {
+            "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+            "parameters": {"cars": args.cars, "concurrency": args.concurrency, "seconds": args.seconds,
+                           "server_threads": int(os.environ.get("CARS_SERVER_THREADS", str(POOL_SIZE)))},
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Mede vazão e latência p95 do serviço Text2SQL com lotes de 1 a 16 prompts.
+
+Uso:
+    ARCTIC_MODEL_NAME=<modelo pequeno> ARCTIC_USE_AUTH_TOKEN=0 \\
+        python benchmarks/bench_text2sql_batching.py [--requests N] [--wait-ms MS]
+
+    # Sem modelo: simula um generate com custo fixo + custo por prompt
+    python benchmarks/bench_text2sql_batching.py --fake
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text2sql_service import Text2SQLBatcher  # noqa: E402
+
+BATCH_SIZES = (1, 2, 4, 8, 16)
+PROMPTS = [
+    "quais carros da Toyota custam menos de 100 mil",
+    "qual a média de preço dos carros da Honda",
+    "liste os modelos com nota acima de 4",
+    "quantos carros foram lançados depois de 2020",
+]
+
+
+def fake_generate(fixed_ms: float, per_prompt_ms: float):
+    """generate simulado: o custo fixo por chamada é o que o lote amortiza."""
+    def generate(prompts):
+        time.sleep((fixed_ms + per_prompt_ms * len(prompts)) / 1000)
+        return ["SELECT 1;" for _ in prompts]
+    return generate
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(batcher: Text2SQLBatcher, clients: int, requests_per_client: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def client(index: int):
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            batcher.text_to_sql(PROMPTS[(index + i) % len(PROMPTS)])
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "average_batch": batcher.prompts / batcher.batches if batcher.batches else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=4, help="requisições por cliente")
+    parser.add_argument("--wait-ms", type=float, default=20)
+    parser.add_argument("--fake", action="store_true", help="usa um generate simulado em vez do modelo")
+    parser.add_argument("--fake-fixed-ms", type=float, default=200)
+    parser.add_argument("--fake-per-prompt-ms", type=float, default=15)
+    args = parser.parse_args()
+
+    generate_fn = None
+    if args.fake:
+        generate_fn = fake_generate(args.fake_fixed_ms, args.fake_per_prompt_ms)
+    else:
+        import carregararctic
+        start = time.perf_counter()
+        carregararctic.load_model()
+        print(f"Modelo {carregararctic.model_name} carregado em {time.perf_counter() - start:.1f} s")
+
+    print(f"{'lote':>4} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'lote médio':>11}")
+    for batch_size in BATCH_SIZES:
+        batcher = Text2SQLBatcher(generate_fn, max_batch_size=batch_size, max_wait_ms=args.wait_ms)
+        # Um cliente concorrente por vaga no lote
+        result = run(batcher, clients=batch_size, requests_per_client=args.requests)
+        batcher.close()
+        print(f"{batch_size:>4} {result['throughput']:>8.2f} {result['p50_ms']:>9.1f} "
+              f"{result['p95_ms']:>9.1f} {result['average_batch']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,327 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
+import os
+import queue
+import re
+import threading
+import time
 
-model_name = "Snowflake/Arctic-Text2SQL-R1-7B"
+import metrics
 
-# Tokenizer
-tokenizer = AutoTokenizer.from_pretrained(model_name, use_auth_token=True)
+# Modelo usado (pode ser um modelo pequeno ou um caminho local para testes)
+model_name = os.environ.get("ARCTIC_MODEL_NAME", "Snowflake/Arctic-Text2SQL-R1-7B")
+# Modelos públicos ou locais não precisam do token do Hugging Face
+use_auth_token = os.environ.get("ARCTIC_USE_AUTH_TOKEN", "1") != "0"
+# Limite de tokens gerados por consulta (a geração para antes, ao fim do comando SQL)
+max_new_tokens = int(os.environ.get("ARCTIC_MAX_NEW_TOKENS", "256"))
+# Segundos sem nenhum trecho novo até o streaming desistir da geração
+stream_timeout = float(os.environ.get("ARCTIC_STREAM_TIMEOUT", "120"))
+# Modo de inferência: auto, gpu-fp16, cpu-int8, cpu-bf16 ou cpu-fp32
+backend = os.environ.get("ARCTIC_BACKEND", "auto")
+# Threads do PyTorch na CPU (0 mantém o padrão do PyTorch)
+num_threads = int(os.environ.get("ARCTIC_THREADS", "0"))
+# Pasta onde o modelo quantizado em int8 é salvo para as próximas execuções ('' desliga)
+quantized_cache_dir = os.environ.get("ARCTIC_QUANTIZED_CACHE", "arctic_cache")
 
-# Modelo
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype=torch.float16,  # melhora performance se tiver GPU
-    device_map="auto",
-    use_auth_token=True
-)
+BACKENDS = ("gpu-fp16", "cpu-int8", "cpu-bf16", "cpu-fp32")
+
+# Quantização do modo cpu-int8: camadas (nomes em torch.nn) e tipo dos pesos; entram no nome do cache
+QUANTIZED_LAYERS = ("Linear",)
+QUANTIZED_DTYPE = "qint8"
+# Formato do arquivo de cache (state_dict + buffers não persistentes); também entra no nome
+QUANTIZED_CACHE_FORMAT = 2
+
+_tokenizer = None
+_model = None
+_load_lock = threading.Lock()
+_warmup_thread = None
+
+def resolve_backend(name=None):
+    """Resolve 'auto': GPU em fp16 se houver CUDA, senão int8 na CPU."""
+    import torch
+
+    name = name or backend
+    if name == "auto":
+        return "gpu-fp16" if torch.cuda.is_available() else "cpu-int8"
+    if name not in BACKENDS:
+        raise ValueError(f"ARCTIC_BACKEND inválido: {name} (use auto ou {', '.join(BACKENDS)})")
+    if name == "cpu-bf16" and not cpu_supports_bf16():
+        print("CPU sem suporte nativo a bf16; usando cpu-fp32.")
+        return "cpu-fp32"
+    return name
+
+def cpu_supports_bf16():
+    """bf16 só compensa em CPUs com AVX-512 (BF16) ou AMX; nas demais é emulado e lento."""
+    import torch
+
+    get_capability = getattr(torch.backends.cpu, "get_cpu_capability", None)
+    return get_capability is not None and get_capability() in ("AVX512", "AVX512_BF16", "AMX")
+
+def quantized_cache_path():
+    """Arquivo do state_dict quantizado: muda com o modelo, as versões do torch/transformers e a quantização."""
+    import torch
+    import transformers
+
+    key = (f"{model_name}-{QUANTIZED_DTYPE}-{'+'.join(QUANTIZED_LAYERS)}-{torch.backends.quantized.engine}"
+           f"-torch{torch.__version__}-transformers{transformers.__version__}-v{QUANTIZED_CACHE_FORMAT}")
+    return os.path.join(quantized_cache_dir, re.sub(r"[^A-Za-z0-9_.+-]+", "_", key) + ".pt")
+
+def _quantize(model):
+    # Quantização dinâmica: pesos das camadas lineares em int8, ativações quantizadas na hora
+    import torch
+
+    layers = {getattr(torch.nn, name) for name in QUANTIZED_LAYERS}
+    return torch.ao.quantization.quantize_dynamic(model.eval(), layers, dtype=getattr(torch, QUANTIZED_DTYPE))
+
+def _quantized_skeleton(config):
+    """Estrutura do modelo já quantizado, sem alocar nem inicializar os pesos em fp32.
+
+    O modelo é criado no dispositivo meta e as camadas lineares são trocadas
+    por lineares quantizadas vazias; os tensores vêm depois do cache, com
+    load_state_dict(assign=True).
+    """
+    from transformers import AutoModelForCausalLM
+    import torch
+
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32)
+    # Mesma troca que o quantize_dynamic faz (QUANTIZED_LAYERS só tem Linear)
+    layers = tuple(getattr(torch.nn, name) for name in QUANTIZED_LAYERS)
+    for parent in list(model.modules()):
+        for name, child in parent.named_children():
+            if type(child) in layers:
+                setattr(parent, name, torch.ao.nn.quantized.dynamic.Linear(
+                    child.in_features, child.out_features, bias_=child.bias is not None,
+                    dtype=getattr(torch, QUANTIZED_DTYPE)))
+    return model.eval()
+
+def _load_quantized_cache(config, path):
+    import torch
+
+    cache = torch.load(path, weights_only=True)
+    model = _quantized_skeleton(config)
+    model.load_state_dict(cache["state_dict"], assign=True)
+    # Buffers fora do state_dict (ex: inv_freq do rotary), calculados no __init__ e perdidos no meta
+    for name, buffer in cache["buffers"].items():
+        module_name, _, buffer_name = name.rpartition(".")
+        model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+    left = [name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta]
+    if left:
+        raise RuntimeError(f"Cache quantizado incompleto, faltam: {', '.join(left[:5])}")
+    return model
+
+def _save_quantized_cache(model, path):
+    import torch
+
+    state_dict = model.state_dict()
+    buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state_dict}
+    os.makedirs(quantized_cache_dir, exist_ok=True)
+    # Grava em um arquivo temporário: uma execução interrompida não deixa um cache pela metade
+    torch.save({"state_dict": state_dict, "buffers": buffers}, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def _load_weights(mode):
+    """Carrega o modelo no modo de inferência escolhido."""
+    from transformers import AutoModelForCausalLM
+    import torch
+
+    if mode == "gpu-fp16":
+        return AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16,  # melhora performance se tiver GPU
+            device_map="auto",
+            use_auth_token=use_auth_token
+        )
+
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+    if mode == "cpu-int8":
+        path = quantized_cache_path() if quantized_cache_dir else None
+        if path and os.path.exists(path):
+            # Pesos já quantizados em uma execução anterior: pula o download e a conversão dos pesos em fp32.
+            # Só tensores são lidos do arquivo (weights_only); a estrutura vem da configuração do modelo.
+            from transformers import AutoConfig
+
+            config = AutoConfig.from_pretrained(model_name, use_auth_token=use_auth_token)
+            return _load_quantized_cache(config, path)
+        model = _quantize(AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32, use_auth_token=use_auth_token))
+        if path:
+            _save_quantized_cache(model, path)
+        return model
+
+    dtype = torch.bfloat16 if mode == "cpu-bf16" else torch.float32
+    return AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=dtype, use_auth_token=use_auth_token).eval()
+
+def load_model():
+    """Carrega tokenizer e modelo na primeira chamada e os reaproveita depois.
+
+    Chamadas que chegam durante uma carga em andamento (inclusive a do
+    aquecimento em segundo plano) esperam por ela em vez de carregar de novo.
+    """
+    global _tokenizer, _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                # Importados aqui para não pesar na inicialização de quem só importa o módulo
+                from transformers import AutoTokenizer
+
+                # Tokenizer
+                tokenizer = AutoTokenizer.from_pretrained(model_name, use_auth_token=use_auth_token)
+                # Geração em lote: prompts alinhados à direita, com padding à esquerda
+                tokenizer.padding_side = "left"
+                if tokenizer.pad_token is None:
+                    tokenizer.pad_token = tokenizer.eos_token
+
+                # Modelo
+                model = _load_weights(resolve_backend())
+                _tokenizer, _model = tokenizer, model
+    return _tokenizer, _model
+
+def is_loaded() -> bool:
+    return _model is not None
+
+def _warm_up():
+    try:
+        load_model()
+    except Exception as e:
+        # A próxima chamada a text_to_sql tenta carregar de novo e mostra o erro
+        print(f"Erro ao pré-carregar o modelo {model_name}: {e}")
+
+def warm_up() -> threading.Thread:
+    """Começa a carregar o modelo em uma thread de fundo (só uma vez) e retorna essa thread."""
+    global _warmup_thread
+    with _load_lock:
+        if _warmup_thread is None and _model is None:
+            _warmup_thread = threading.Thread(target=_warm_up, name="arctic-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+schema = """
+    Tabela: cars
+    Colunas: id, brand, model, year, price, mileage, rating, launch_date
+    """
+
+def build_prompt(prompt):
+    return f"{schema}\n\nUsuário: {prompt}\nSQL:"
+
+# Fim de comando: ';' ou uma linha em branco depois de algum SQL
+_STATEMENT_END = re.compile(r";|\S[ \t]*\r?\n[ \t]*\r?\n")
+
+def statement_complete(text):
+    return _STATEMENT_END.search(text) is not None
+
+def extract_sql(text):
+    """Recorta o primeiro comando SQL do texto gerado (até o ';', sem cercas de markdown)."""
+    text = re.sub(r"^\s*```(?:sql)?", "", text).strip()
+    match = _STATEMENT_END.search(text)
+    if match:
+        # Mantém o ';' (ou o último caractere antes da linha em branco)
+        text = text[:match.start() + 1]
+    return text.replace("```", "").strip()
+
+def _stopping_criteria(tokenizer, prompt_length):
+    """Critério de parada: cada linha do lote para assim que seu comando SQL termina."""
+    from transformers import StoppingCriteria, StoppingCriteriaList
+    import torch
+
+    class SqlStatementStop(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            texts = tokenizer.batch_decode(input_ids[:, prompt_length:], skip_special_tokens=True)
+            return torch.tensor([statement_complete(t) for t in texts], device=input_ids.device)
+
+    return StoppingCriteriaList([SqlStatementStop()])
+
+def _generate_kwargs(tokenizer, inputs):
+    return dict(
+        inputs,
+        max_new_tokens=max_new_tokens,
+        stopping_criteria=_stopping_criteria(tokenizer, inputs["input_ids"].shape[1]),
+        pad_token_id=tokenizer.pad_token_id,
+    )
+
+def generate_sql_batch(prompts):
+    """Gera o SQL de vários prompts em uma única chamada a generate.
+
+    Retorna uma lista na mesma ordem dos prompts, só com o texto gerado
+    (sem o prompt de entrada).
+    """
+    tokenizer, model = load_model()
+    with metrics.text2sql_stage_duration.time(stage="tokenize"):
+        inputs = tokenizer([build_prompt(p) for p in prompts], return_tensors="pt", padding=True).to(model.device)
+    with metrics.text2sql_stage_duration.time(stage="generate"):
+        outputs = model.generate(**_generate_kwargs(tokenizer, inputs))
+    with metrics.text2sql_stage_duration.time(stage="decode"):
+        # Com padding à esquerda, os tokens novos começam no mesmo ponto em todas as linhas
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        return [extract_sql(sql) for sql in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
 
 # Função de inferência
 def text_to_sql(prompt):
-    schema = """
-    Tabela: cars
-    Colunas: id, brand, model, price, rating, launch_date
+    tokenizer, model = load_model()
+    full_prompt = build_prompt(prompt)
+    with metrics.text2sql_stage_duration.time(stage="tokenize"):
+        inputs = tokenizer(full_prompt, return_tensors="pt").to(model.device)
+    with metrics.text2sql_stage_duration.time(stage="generate"):
+        outputs = model.generate(**_generate_kwargs(tokenizer, inputs))
+    with metrics.text2sql_stage_duration.time(stage="decode"):
+        # Decodifica só os tokens novos: o esquema e o prompt não fazem parte do SQL
+        sql = tokenizer.decode(outputs[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        return extract_sql(sql)
+
+def text_to_sql_stream(prompt):
+    """Gera o SQL aos poucos, devolvendo cada trecho de texto assim que é produzido.
+
+    Para no fim do comando SQL; juntar os trechos e passar por extract_sql
+    dá o mesmo resultado de text_to_sql. Um erro na geração é relançado aqui
+    depois dos trechos já produzidos, e um intervalo maior que stream_timeout
+    sem trecho novo vira TimeoutError.
     """
-    full_prompt = f"{schema}\n\nUsuário: {prompt}\nSQL:"
-    inputs = tokenizer(full_prompt, return_tensors="pt").to(model.device)
-    outputs = model.generate(**inputs, max_length=512)
-    sql = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    return sql
\ No newline at end of file
+    from transformers import TextIteratorStreamer
+
+    tokenizer, model = load_model()
+    with metrics.text2sql_stage_duration.time(stage="tokenize"):
+        inputs = tokenizer(build_prompt(prompt), return_tensors="pt").to(model.device)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=stream_timeout)
+    errors = []
+
+    def generate():
+        try:
+            model.generate(**_generate_kwargs(tokenizer, inputs), streamer=streamer)
+        except BaseException as e:
+            # Sem o fim do streamer, o laço abaixo ficaria esperando para sempre
+            errors.append(e)
+            streamer.end()
+
+    worker = threading.Thread(target=generate, daemon=True)
+    start = time.perf_counter()
+    worker.start()
+    generated = ""
+    stuck = False
+    try:
+        for piece in streamer:
+            generated += piece
+            match = _STATEMENT_END.search(generated)
+            if match:
+                # Entrega só até o fim do comando
+                keep = len(piece) - (len(generated) - match.start() - 1)
+                yield piece[:max(keep, 0)]
+                break
+            yield piece
+    except queue.Empty:
+        stuck = True
+        raise TimeoutError(f"Nenhum trecho gerado em {stream_timeout:.0f} s") from None
+    finally:
+        # O critério de parada encerra a geração logo depois do fim do comando
+        if not stuck:
+            try:
+                for _ in streamer:
+                    pass
+            except queue.Empty:
+                stuck = True
+        # Uma geração travada fica para trás (a thread é daemon)
+        if not stuck:
+            worker.join()
+        # Geração e decodificação acontecem juntas no streaming
+        metrics.text2sql_stage_duration.observe(time.perf_counter() - start, stage="generate_stream")
+    if errors:
+        raise errors[0]
+
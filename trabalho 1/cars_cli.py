@@ -0,0 +1,305 @@
+"""Importação e exportação em massa de carros (CSV ou JSONL) direto no banco.
+
+Os arquivos são lidos e escritos em blocos, com memória constante qualquer
+que seja o tamanho. Cada bloco importado é gravado em uma transação junto com
+o checkpoint (posição no arquivo), então uma importação interrompida continua
+de onde parou ao rodar o mesmo comando de novo.
+
+Uso:
+    python cars_cli.py import carros.csv [--chunk-size 50000] [--restart] [--bulk]
+    python cars_cli.py export backup.jsonl [--after-id 0]
+    python cars_cli.py checkpoints
+    python cars_cli.py reindex
+
+Campos aceitos na importação (em inglês, como na API, ou em português, como em
+lista): brand/marca, model/modelo, year/ano, price/preço, mileage/kilometragem,
+rating/nota e launch_date/data_lancamento. brand, model, price e rating são
+obrigatórios e passam pelas mesmas validações de add_car; as demais colunas
+(como imagem) são ignoradas. O formato vem da extensão (.csv, .jsonl, .ndjson)
+ou de --format.
+"""
+import argparse
+import contextlib
+import csv
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import database
+from database import validate_car
+
+# Linhas gravadas por transação (e entre checkpoints)
+CHUNK_SIZE = 50000
+# Bytes do início do arquivo usados para reconhecê-lo ao retomar uma importação
+FINGERPRINT_BYTES = 1 << 20
+# Erros de validação mostrados no terminal (os demais só entram na contagem)
+MAX_ERRORS_SHOWN = 10
+
+# Colunas exportadas, na ordem do arquivo
+EXPORT_FIELDS = ["brand", "model", "year", "price", "mileage", "rating", "launch_date"]
+
+# Nome no arquivo -> coluna de cars
+FIELD_ALIASES = {
+    "brand": "brand", "marca": "brand",
+    "model": "model", "modelo": "model",
+    "year": "year", "ano": "year",
+    "price": "price", "preço": "price", "preco": "price",
+    "mileage": "mileage", "kilometragem": "mileage", "quilometragem": "mileage",
+    "rating": "rating", "nota": "rating",
+    "launch_date": "launch_date", "data_lancamento": "launch_date",
+}
+
+INSERT_CAR = (
+    "INSERT INTO cars (brand, model, year, price, mileage, rating, launch_date) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+EXPORT_QUERY = f"SELECT id, {', '.join(EXPORT_FIELDS)} FROM cars WHERE id > ? ORDER BY id LIMIT ?"
+
+SAVE_CHECKPOINT = """
+    INSERT INTO import_checkpoints (source, fingerprint, byte_offset, records, inserted, rejected, finished, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (source) DO UPDATE SET
+        fingerprint = excluded.fingerprint, byte_offset = excluded.byte_offset, records = excluded.records,
+        inserted = excluded.inserted, rejected = excluded.rejected, finished = excluded.finished,
+        updated_at = excluded.updated_at
+"""
+
+
+def detect_format(path: str, fmt: str = None) -> str:
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Não foi possível deduzir o formato de {path}; use --format csv ou --format jsonl.")
+
+
+def fingerprint(path: str) -> str:
+    """Hash do início do arquivo: identifica o arquivo ao retomar (ele pode ter crescido no fim)."""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(FINGERPRINT_BYTES)).hexdigest()
+
+
+def _tracked_lines(f, position: list):
+    """Gera as linhas do arquivo binário já decodificadas; position[0] é o byte logo após a última lida."""
+    for line in iter(f.readline, b""):
+        position[0] += len(line)
+        yield line.decode("utf-8-sig" if position[0] == len(line) else "utf-8")
+
+
+def read_records(path: str, fmt: str, offset: int = 0):
+    """Gera (registro, byte após o registro) a partir de offset.
+
+    Os registros são dicionários com os nomes do arquivo. No CSV, o cabeçalho
+    é sempre lido da primeira linha, mesmo ao retomar do meio do arquivo.
+    """
+    with open(path, "rb") as f:
+        position = [0]
+        if fmt == "csv":
+            header = next(csv.reader(_tracked_lines(f, position)), None)
+            if header is None:
+                return
+            if offset > position[0]:
+                f.seek(offset)
+                position[0] = offset
+            # csv.reader pede uma linha por vez, então a posição fica no fim do registro
+            for values in csv.reader(_tracked_lines(f, position)):
+                if values:
+                    yield dict(zip(header, values)), position[0]
+        else:
+            f.seek(offset)
+            position[0] = offset
+            for line in _tracked_lines(f, position):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None  # rejeitado na validação
+                yield record, position[0]
+
+
+def _optional(value, convert):
+    if value is None or value == "":
+        return None
+    return convert(value)
+
+
+def car_row(record) -> tuple:
+    """Converte um registro do arquivo na linha de INSERT_CAR, levantando ValueError se for inválido."""
+    if not isinstance(record, dict):
+        raise ValueError("Registro não é um objeto JSON válido.")
+    car = {}
+    for name, value in record.items():
+        column = FIELD_ALIASES.get(str(name).strip().lower())
+        if column:
+            car[column] = value.strip() if isinstance(value, str) else value
+    if car.get("price") in (None, "") or car.get("rating") in (None, ""):
+        raise ValueError("Campos obrigatórios: brand, model, price, rating")
+    brand, model = car.get("brand"), car.get("model")
+    price, rating = float(car["price"]), float(car["rating"])
+    validate_car(brand, model, price, rating)
+    year = _optional(car.get("year"), lambda value: int(float(value)))
+    mileage = _optional(car.get("mileage"), float)
+    if mileage is not None and mileage < 0:
+        raise ValueError("Quilometragem não pode ser negativa.")
+    launch_date = _optional(car.get("launch_date"), str)
+    return (brand, model, year, price, mileage, rating, launch_date)
+
+
+def load_checkpoint(conn: sqlite3.Connection, source: str):
+    return conn.execute(
+        "SELECT fingerprint, byte_offset, records, inserted, rejected, finished "
+        "FROM import_checkpoints WHERE source = ?", (source,)
+    ).fetchone()
+
+
+def import_file(conn: sqlite3.Connection, path: str, fmt: str, chunk_size: int = CHUNK_SIZE,
+                restart: bool = False, bulk: bool = False) -> dict:
+    """Importa o arquivo em blocos, retomando do checkpoint quando houver.
+
+    Com bulk, índices e gatilhos de cars são removidos durante a carga e
+    recriados no fim (bem mais rápido, mas só com o banco fora de uso).
+    """
+    source = os.path.abspath(path)
+    current = fingerprint(path)
+    offset, records, inserted, rejected = 0, 0, 0, 0
+    checkpoint = load_checkpoint(conn, source)
+    if checkpoint and not restart:
+        saved_fingerprint, saved_offset, saved_records, saved_inserted, saved_rejected, finished = checkpoint
+        if saved_fingerprint != current:
+            raise ValueError(f"{path} mudou desde a última importação; use --restart para importar do início.")
+        if finished:
+            print(f"{path} já foi importado ({saved_inserted} carros); use --restart para importar de novo.")
+            return {"records": saved_records, "inserted": saved_inserted, "rejected": saved_rejected}
+        offset, records, inserted, rejected = saved_offset, saved_records, saved_inserted, saved_rejected
+        print(f"Retomando {path} do byte {offset} ({inserted} carros já importados).")
+
+    def save(chunk: list, position: int, finished: bool = False):
+        with conn:
+            if chunk:
+                conn.executemany(INSERT_CAR, chunk)
+            conn.execute(SAVE_CHECKPOINT, (
+                source, current, position, records, inserted, rejected, int(finished),
+                datetime.datetime.now().isoformat(timespec="seconds"),
+            ))
+
+    start = time.perf_counter()
+    chunk = []
+    position = offset
+    # Sem bulk, índices e gatilhos continuam ativos: o servidor pode estar usando o banco
+    loader = database.bulk_load(conn) if bulk else contextlib.nullcontext(conn)
+    with loader:
+        for record, position in read_records(path, fmt, offset):
+            records += 1
+            try:
+                chunk.append(car_row(record))
+            except (ValueError, TypeError) as e:
+                rejected += 1
+                if rejected <= MAX_ERRORS_SHOWN:
+                    print(f"Registro {records} rejeitado: {e}")
+                continue
+            if len(chunk) >= chunk_size:
+                inserted += len(chunk)
+                save(chunk, position)
+                chunk = []
+                print(f"{inserted} carros importados ({records / (time.perf_counter() - start):.0f} registros/s)...")
+        inserted += len(chunk)
+        save(chunk, position, finished=True)
+        print("Recriando índices e resumos..." if bulk else "Concluindo...")
+    if rejected > MAX_ERRORS_SHOWN:
+        print(f"... e mais {rejected - MAX_ERRORS_SHOWN} registros rejeitados.")
+    print(f"Importação concluída em {time.perf_counter() - start:.1f} s: "
+          f"{inserted} carros importados, {rejected} rejeitados.")
+    return {"records": records, "inserted": inserted, "rejected": rejected}
+
+
+def export_file(conn: sqlite3.Connection, path: str, fmt: str, chunk_size: int = CHUNK_SIZE, after_id: int = 0) -> int:
+    """Exporta os carros em ordem de id, lendo um bloco por vez (paginação por keyset)."""
+    start = time.perf_counter()
+    exported = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_FIELDS)
+        while True:
+            rows = conn.execute(EXPORT_QUERY, (after_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            if writer:
+                writer.writerows(row[1:] for row in rows)
+            else:
+                f.writelines(
+                    json.dumps(dict(zip(EXPORT_FIELDS, row[1:])), ensure_ascii=False) + "\n" for row in rows
+                )
+            exported += len(rows)
+    print(f"{exported} carros exportados para {path} em {time.perf_counter() - start:.1f} s.")
+    return exported
+
+
+def print_checkpoints(conn: sqlite3.Connection):
+    rows = conn.execute(
+        "SELECT source, byte_offset, inserted, rejected, finished, updated_at FROM import_checkpoints ORDER BY updated_at"
+    ).fetchall()
+    if not rows:
+        print("Nenhuma importação registrada.")
+    for source, offset, inserted, rejected, finished, updated_at in rows:
+        status = "concluída" if finished else f"parada no byte {offset}"
+        print(f"{source}: {status}, {inserted} importados, {rejected} rejeitados ({updated_at})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="caminho do banco (padrão: CARS_DB_PATH ou cars.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="importa carros de um arquivo CSV ou JSONL")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"])
+    import_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    import_parser.add_argument("--restart", action="store_true", help="ignora o checkpoint e importa do início")
+    import_parser.add_argument("--bulk", action="store_true",
+                               help="remove índices e gatilhos durante a carga (mais rápido; só com o servidor parado)")
+
+    export_parser = commands.add_parser("export", help="exporta os carros para um arquivo CSV ou JSONL")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"])
+    export_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    export_parser.add_argument("--after-id", type=int, default=0, help="exporta só os carros com id maior")
+
+    commands.add_parser("checkpoints", help="lista as importações registradas")
+    commands.add_parser("reindex", help="recria índices, gatilhos e resumos (após uma importação interrompida)")
+
+    args = parser.parse_args()
+    conn = database.connect(args.db)
+    try:
+        database.migrate(conn)
+        if args.command == "import":
+            import_file(conn, args.path, detect_format(args.path, args.format), args.chunk_size,
+                        args.restart, args.bulk)
+        elif args.command == "export":
+            export_file(conn, args.path, detect_format(args.path, args.format), args.chunk_size, args.after_id)
+        elif args.command == "checkpoints":
+            print_checkpoints(conn)
+        elif args.command == "reindex":
+            with database.bulk_load(conn):
+                pass
+            print("Índices, gatilhos e resumos recriados.")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Erro: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
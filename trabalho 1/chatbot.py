@@ -1,39 +1,53 @@
-import requests
+import os
+import httpx
 import json
 import re
 import datetime
-from image_processing import analyze_image
-from carregararctic import text_to_sql
+from image_processing import analyze_image, analyze_images, list_images
+import video_ingest
+import carregararctic
+from carregararctic import extract_sql, text_to_sql_stream
+import mcp_client
+from query_router import QueryRouter, normalize_prompt
+from sql_executor import GuardedQuery, QueryRejected, QueryTimeout
 import sqlite3
 
 # URL do servidor MCP (ajuste conforme necessário)
 SERVER_URL = "http://localhost:8000"
 
+# Pré-carrega o modelo Text2SQL em segundo plano ao iniciar ('0' desliga)
+WARMUP_MODEL = os.environ.get("CHATBOT_WARMUP_MODEL", "1") != "0"
+
+# Serviço Text2SQL compartilhado (text2sql_service.py); vazio usa o modelo local
+TEXT2SQL_SERVICE_URL = os.environ.get("TEXT2SQL_SERVICE_URL")
+
+# Cliente único do servidor: reaproveita as conexões keep-alive entre comandos
+server = mcp_client.CarClient(SERVER_URL)
+text2sql_http = httpx.Client(base_url=TEXT2SQL_SERVICE_URL, timeout=None) if TEXT2SQL_SERVICE_URL else None
+
 def add_car_to_server(brand: str, model: str, price: float, rating: float):
     """Adiciona um carro ao servidor."""
-    payload = {
-        "brand": brand,
-        "model": model,
-        "price": price,
-        "rating": rating
-    }
-    response = requests.post(f"{SERVER_URL}/add_car", json=payload)
-    return response.json()
+    return server.add_car(brand, model, price, rating)
+
+def add_cars_batch_to_server(cars: list):
+    """Adiciona vários carros ao servidor em lotes (uma transação por lote)."""
+    return server.add_cars_batch(cars)
 
 def get_cars_by_brand(brand: str):
     """Obtém carros de uma marca específica do servidor."""
-    response = requests.get(f"{SERVER_URL}/get_cars_by_brand?brand={brand}")
-    return response.json()
+    return server.get_cars_by_brand(brand)
 
 def get_cars_by_model(model: str):
     """Obtém carros de um modelo específico do servidor."""
-    response = requests.get(f"{SERVER_URL}/get_cars_by_model?model={model}")
-    return response.json()
+    return server.get_cars_by_model(model)
 
 def get_all_cars():
     """Obtém todos os carros do servidor."""
-    response = requests.get(f"{SERVER_URL}/get_all_cars")
-    return response.json()
+    return server.get_all_cars()
+
+def get_cars_filtered(brand: str = None, start_date: str = None, end_date: str = None, min_rating: float = None, limit: int = 10):
+    """Obtém carros filtrados do servidor."""
+    return server.get_cars_filtered(brand, start_date, end_date, min_rating, limit)
 
 def process_image_and_add_car(image_path: str):
     """Processa a imagem e adiciona o carro ao servidor."""
@@ -41,6 +55,38 @@ def process_image_and_add_car(image_path: str):
     result = add_car_to_server(brand, model, price, rating)
     return result
 
+def process_video_and_add_cars(source: str):
+    """Analisa um vídeo (ou pasta de fotos em sequência) pulando quadros repetidos e adiciona os carros em lote."""
+    report = video_ingest.ingest(source)
+    cars = report["cars"]
+    result = add_cars_batch_to_server(cars) if cars else {"inserted": 0, "accepted": [], "rejected": []}
+    result["report"] = report
+    return result
+
+def submit_image_to_server(image_path: str):
+    """Envia a imagem para a fila de análise do servidor, sem esperar o OCR."""
+    return server.submit_image(image_path)
+
+def get_job_status(job_id: int):
+    """Obtém o status de um job de análise de imagem do servidor."""
+    return server.get_job(job_id)
+
+def process_folder_and_add_cars(directory: str, workers: int = None):
+    """Analisa todas as imagens de uma pasta em paralelo e adiciona os carros em lote."""
+    cars = []
+    failures = []
+    for image_path, result, error in analyze_images(list_images(directory), workers=workers):
+        if error:
+            print(f"  ✗ {image_path}: {error}")
+            failures.append(image_path)
+            continue
+        brand, model, price, rating = result
+        print(f"  ✓ {image_path}: {brand} {model}, R${price}, nota {rating}")
+        cars.append({"brand": brand, "model": model, "price": price, "rating": rating})
+    result = add_cars_batch_to_server(cars) if cars else {"inserted": 0, "accepted": [], "rejected": []}
+    result["failed_images"] = failures
+    return result
+
 def parse_add_prompt(prompt: str) -> dict:
     """Parse a prompt to add a car, e.g., 'o novo carro da Nissan lançado ontem é nota 9'."""
     # Extract brand
@@ -105,18 +151,72 @@ def parse_query_prompt(prompt: str) -> dict:
         "limit": limit
     }
 
+def streaming_text_to_sql(prompt: str) -> str:
+    """Gera o SQL com o modelo local, mostrando a consulta enquanto ela é gerada."""
+    print("\n🧠 SQL gerado pelo modelo:")
+    pieces = []
+    for piece in text_to_sql_stream(prompt):
+        print(piece, end="", flush=True)
+        pieces.append(piece)
+    print("\n")
+    return extract_sql("".join(pieces))
+
+def remote_text_to_sql(prompt: str) -> str:
+    """Gera o SQL pelo serviço Text2SQL, que agrupa consultas de várias sessões em lotes."""
+    response = text2sql_http.post("/text_to_sql", json={"prompt": prompt})
+    if response.status_code != 200:
+        raise RuntimeError(f"Serviço Text2SQL falhou: {response.text}")
+    return response.json()["sql"]
+
+# Consultas que o parser determinístico entende por completo, ex:
+# 'quais os 10 melhores carros da nissan lancados entre 2010 e hoje'
+STRUCTURED_QUERY_PATTERN = re.compile(
+    r"(quais (sao )?)?(os )?(\d+ )?melhores carros( da \w+)?( lancados entre \d{4} e (\d{4}|hoje))?"
+)
+
+def parse_structured_query(prompt: str):
+    """Retorna os filtros de get_cars_filtered se a consulta seguir o formato conhecido, senão None."""
+    if not STRUCTURED_QUERY_PATTERN.fullmatch(normalize_prompt(prompt)):
+        return None
+    return parse_query_prompt(prompt)
+
+# Roteador do comando 'consultar': parser -> cache de SQL -> modelo
+query_router = QueryRouter(
+    parse_structured_query,
+    get_cars_filtered,
+    remote_text_to_sql if TEXT2SQL_SERVICE_URL else streaming_text_to_sql
+)
+
+def print_router_stats():
+    """Mostra quantas consultas cada nível resolveu e o histograma de latência."""
+    stats = query_router.stats()
+    print(f"Consultas em cache: {stats['cached_queries']}")
+    for tier, hits in stats["hits"].items():
+        latency = stats["latency"][tier]
+        average = latency["total_ms"] / hits if hits else 0.0
+        buckets = ", ".join(f"{label}: {count}" for label, count in latency["buckets"].items() if count)
+        print(f"  - {tier}: {hits} consulta(s), média {average:.1f} ms" + (f" ({buckets})" if buckets else ""))
+
 def chatbot():
     """Interface simples do chatbot."""
+    if WARMUP_MODEL and not TEXT2SQL_SERVICE_URL:
+        # O usuário já pode digitar comandos enquanto o modelo carrega
+        carregararctic.warm_up()
     print("Bem-vindo ao Chatbot de Análise de Carros!")
     print("Você pode enviar uma imagem de um carro para análise ou usar comandos de texto.")
     print("Comandos disponíveis:")
     print("1. 'analisar <caminho_da_imagem>' - Analisar uma imagem de carro")
+    print("   'analisar pasta <diretório>' - Analisar todas as imagens de uma pasta")
+    print("   'analisar video <arquivo ou pasta>' - Analisar um vídeo ou sequência de fotos, pulando quadros repetidos")
+    print("   'enviar <caminho_da_imagem>' - Enviar a imagem para a fila do servidor, sem esperar a análise")
+    print("   'job <id>' - Ver o status de uma imagem enviada")
     print("2. 'buscar marca <marca>' - Buscar carros por marca")
     print("3. 'buscar modelo <modelo>' - Buscar carros por modelo")
     print("4. 'listar todos' - Listar todos os carros")
     print("5. 'adicionar <descrição do carro>' - Adicionar carro via texto, ex: 'adicionar o novo carro da Nissan lançado ontem é nota 9'")
     print("6. 'consultar <consulta>' - Consultar carros via texto, ex: 'consultar quais os 10 melhores carros da Nissan lançados entre 2010 e hoje'")
-    print("7. 'sair' - Sair do chatbot")
+    print("7. 'estatisticas' - Ver quantas consultas cada nível do roteador resolveu")
+    print("8. 'sair' - Sair do chatbot")
     
     while True:
         user_input = input("\nDigite seu comando: ").strip()
@@ -124,6 +224,25 @@ def chatbot():
         if user_input.lower() == 'sair':
             print("Até logo!")
             break
+        elif user_input in ('estatisticas', 'estatísticas'):
+            print_router_stats()
+        elif user_input.startswith('analisar pasta '):
+            directory = user_input[15:]  # Remove 'analisar pasta ' do início
+            try:
+                result = process_folder_and_add_cars(directory)
+                print(f"{result['inserted']} carro(s) adicionado(s), "
+                      f"{len(result['rejected'])} rejeitado(s), "
+                      f"{len(result['failed_images'])} imagem(ns) com falha.")
+            except Exception as e:
+                print(f"Erro ao analisar a pasta: {e}")
+        elif user_input.startswith('analisar video '):
+            source = user_input[15:]  # Remove 'analisar video ' do início
+            try:
+                result = process_video_and_add_cars(source)
+                video_ingest.print_report(result["report"])
+                print(f"{result['inserted']} carro(s) adicionado(s), {len(result['rejected'])} rejeitado(s).")
+            except Exception as e:
+                print(f"Erro ao analisar o vídeo: {e}")
         elif user_input.startswith('analisar '):
             image_path = user_input[9:]  # Remove 'analisar ' do início
             try:
@@ -131,6 +250,32 @@ def chatbot():
                 print(f"Carro adicionado: {result}")
             except Exception as e:
                 print(f"Erro ao analisar a imagem: {e}")
+        elif user_input.startswith('enviar '):
+            image_path = user_input[7:]  # Remove 'enviar ' do início
+            try:
+                result = submit_image_to_server(image_path)
+                if "error" in result:
+                    print(result["error"])
+                else:
+                    print(f"Imagem na fila (job {result['job_id']}); acompanhe com 'job {result['job_id']}'.")
+            except Exception as e:
+                print(f"Erro ao enviar a imagem: {e}")
+        elif user_input.startswith('job '):
+            try:
+                job = get_job_status(int(user_input[4:]))
+                if "status" not in job:
+                    print(job["error"])
+                elif job["status"] == "done":
+                    car = job["result"]
+                    print(f"Concluído: {car['brand']} {car['model']}, R${car['price']}, nota {car['rating']} (carro {job['car_id']})")
+                elif job["status"] == "failed":
+                    print(f"Falhou após {job['attempts']} tentativa(s): {job['error']}")
+                else:
+                    print(f"Status: {job['status']} ({job['attempts']} tentativa(s))")
+            except ValueError:
+                print("Use: job <id>")
+            except Exception as e:
+                print(f"Erro ao consultar o job: {e}")
         elif user_input.startswith('buscar marca '):
             brand = user_input[13:]  # Remove 'buscar marca ' do início
             try:
@@ -171,40 +316,63 @@ def chatbot():
             try:
                 car_info = parse_add_prompt(prompt)
                 # Use add_car_with_date endpoint
-                payload = {
-                    "brand": car_info["brand"],
-                    "model": car_info["model"],
-                    "price": car_info["price"],
-                    "rating": car_info["rating"],
-                    "launch_date": car_info["launch_date"]
-                }
-                response = requests.post(f"{SERVER_URL}/add_car_with_date", json=payload)
-                if response.status_code == 200:
-                    print("Carro adicionado com sucesso via texto!")
+                result = server.add_car_with_date(
+                    car_info["brand"],
+                    car_info["model"],
+                    car_info["price"],
+                    car_info["rating"],
+                    car_info["launch_date"]
+                )
+                if isinstance(result, dict) and "error" in result:
+                    print(f"Erro ao adicionar carro: {result['error']}")
                 else:
-                    print(f"Erro ao adicionar carro: {response.text}")
+                    print("Carro adicionado com sucesso via texto!")
             except Exception as e:
                 print(f"Erro ao processar comando de adicionar: {e}")
         elif user_input.startswith('consultar '):
             prompt = user_input[9:]
             try:
-                # Gera SQL a partir do prompt em linguagem natural
-                sql_query = text_to_sql(prompt)
-                print(f"\n🧠 SQL gerado pelo modelo:\n{sql_query}\n")
-
-                # Executa a query diretamente no banco local
-                conn = sqlite3.connect("cars.db")
-                cursor = conn.cursor()
-                cursor.execute(sql_query)
-                rows = cursor.fetchall()
-                conn.close()
-
-                if rows:
-                    print("📊 Resultados da consulta:")
-                    for row in rows:
-                        print(row)
-                else:
-                    print("Nenhum resultado encontrado.")
+                route = query_router.route(prompt)
+                if route["tier"] == "parser":
+                    # Consulta resolvida sem o modelo, direto por get_cars_filtered
+                    cars = route["cars"]
+                    if cars:
+                        print("📊 Resultados da consulta:")
+                        for car in cars:
+                            print(f"  - Marca: {car['brand']}, Modelo: {car['model']}, Preço: R${car['price']}, Nota: {car['rating']}, Lançamento: {car['launch_date']}")
+                    else:
+                        print("Nenhum resultado encontrado.")
+                    continue
+
+                sql_query = route["sql"]
+                # O SQL do modelo local já foi mostrado enquanto era gerado
+                if route["tier"] == "sql_cache":
+                    print(f"\n🧠 SQL do cache:\n{sql_query}\n")
+                elif TEXT2SQL_SERVICE_URL:
+                    print(f"\n🧠 SQL gerado pelo modelo:\n{sql_query}\n")
+
+                # Executa a query no banco local, somente leitura e com limites
+                try:
+                    with GuardedQuery(sql_query) as query:
+                        for row in query:
+                            if query.rows_returned == 1:
+                                print("📊 Resultados da consulta:")
+                                print(f"  {tuple(query.columns)}")
+                            print(f"  {row}")
+                        if query.rows_returned == 0:
+                            print("Nenhum resultado encontrado.")
+                        elif query.truncated:
+                            print(f"⚠️ Resultado truncado: exibindo as primeiras {query.rows_returned} linhas.")
+                except QueryRejected as e:
+                    # Não reaproveita SQL recusado
+                    query_router.forget(prompt)
+                    print(f"🚫 Consulta recusada: {e}")
+                except QueryTimeout as e:
+                    print(f"⏱️ {e}")
+                except sqlite3.Error:
+                    # Não reaproveita SQL que não executa
+                    query_router.forget(prompt)
+                    raise
 
             except Exception as e:
                 print(f"Erro ao processar comando de consultar: {e}")
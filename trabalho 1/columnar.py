@@ -0,0 +1,387 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+# Configuração (variáveis de ambiente)
+COLUMNAR_ENABLED = os.environ.get("CARS_COLUMNAR_ENABLED", "0") == "1"
+# Consultas de get_cars_filtered respondidas pelo snapshot: 'dates' (só intervalos de datas
+# sem marca, em que o SQLite precisa ordenar o intervalo inteiro por nota) ou 'all'
+COLUMNAR_ROUTE = os.environ.get("CARS_COLUMNAR_ROUTE", "dates")
+# Intervalo mínimo (s) entre recargas completas quando o snapshot diverge do banco
+RELOAD_INTERVAL = float(os.environ.get("CARS_COLUMNAR_RELOAD_INTERVAL", "60"))
+
+# Linhas lidas do cursor por vez ao carregar o snapshot
+LOAD_CHUNK_SIZE = 100000
+# Capacidade inicial das colunas; dobra quando enche
+INITIAL_CAPACITY = 1024
+
+# Carros depois do watermark, em ordem de rowid
+NEW_CARS_QUERY = "SELECT id, brand, model, price, rating, launch_date FROM cars WHERE id > ? ORDER BY id"
+
+# Conferência barata: maior id, total de carros com marca (pelo resumo brand_stats, O(marcas))
+# e carros sem marca (pelo índice de marca, O(carros sem marca))
+CONSISTENCY_QUERY = (
+    "SELECT (SELECT MAX(id) FROM cars), (SELECT COALESCE(SUM(car_count), 0) FROM brand_stats), "
+    "(SELECT COUNT(*) FROM cars WHERE brand IS NULL)"
+)
+
+# Dia usado para datas ausentes (NULL) na coluna de dias
+NO_DATE = np.iinfo(np.int32).min
+
+columnar_duration = metrics.registry.histogram(
+    "cars_columnar_duration_seconds", "Duração das operações do snapshot colunar (refresh, reload, query).")
+
+
+def routes_to_columnar(brand: str, start_date: str, end_date: str) -> bool:
+    """Se a consulta de get_cars_filtered deve ir para o snapshot, conforme COLUMNAR_ROUTE.
+
+    Com marca, nota mínima ou sem filtro, o SQLite lê os carros já na ordem de
+    nota por um índice e para no limit; só o intervalo de datas o obriga a
+    ordenar todos os carros do intervalo.
+    """
+    return COLUMNAR_ROUTE == "all" or (not brand and bool(start_date or end_date))
+
+
+def day_number(value):
+    """Dias desde 1970-01-01 de uma data 'AAAA-MM-DD'; None se o valor não estiver exatamente nesse formato."""
+    if not isinstance(value, str) or len(value) != 10:
+        return None
+    try:
+        day = np.datetime64(value, "D")
+    except ValueError:
+        return None
+    # Só a forma canônica compara como texto do mesmo jeito que o número de dias
+    return int(day.astype(np.int64)) if str(day) == value else None
+
+
+def _float_column(values: tuple) -> tuple:
+    """Converte valores REAL (ou NULL) em float64; retorna (array, quantidade de valores não numéricos)."""
+    try:
+        return np.array(values, dtype=np.float64), 0
+    except (TypeError, ValueError):
+        pass
+    column = np.empty(len(values), dtype=np.float64)
+    unsupported = 0
+    for i, value in enumerate(values):
+        if value is None or isinstance(value, (int, float)):
+            column[i] = math.nan if value is None else value
+        else:
+            column[i] = math.nan
+            unsupported += 1
+    return column, unsupported
+
+
+def _day_column(values: tuple, known: dict) -> tuple:
+    """Converte datas 'AAAA-MM-DD' (ou NULL) em dias; retorna (array, quantidade de datas em outro formato).
+
+    known guarda as conversões já feitas (data -> dia, NO_DATE se não for
+    convertível): há poucas datas distintas, então cada uma é convertida uma vez.
+    """
+    for value in set(values).difference(known):
+        day = day_number(value)
+        known[value] = NO_DATE if day is None else day
+    unsupported = 0
+    if NO_DATE in known.values():
+        unsupported = sum(values.count(value) for value, day in known.items() if day == NO_DATE and value is not None)
+    return np.fromiter(map(known.__getitem__, values), dtype=np.int32, count=len(values)), unsupported
+
+
+class _Dictionary:
+    """Codificação por dicionário de uma coluna de texto (valor <-> código inteiro)."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, values: tuple) -> np.ndarray:
+        for value in set(values).difference(self.codes):
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+        return np.fromiter(map(self.codes.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+class ColumnarSnapshot:
+    """Cópia em memória da tabela cars, em colunas NumPy, para responder get_cars_filtered.
+
+    Marca e modelo são codificados por dicionário, preço e nota ficam em
+    float64 (NULL = NaN) e a data de lançamento em dias desde 1970 (int32).
+    Os filtros viram máscaras vetorizadas e o top-k por nota usa argpartition.
+
+    O snapshot acompanha o banco por um watermark de rowid: a cada consulta
+    lê só os carros com id maior que o último carregado. Remoções (e a
+    reutilização de ids) são detectadas comparando os totais com o resumo
+    brand_stats e com a contagem de carros sem marca; nesse caso o snapshot
+    é recarregado do zero em uma thread de fundo, no máximo uma vez a cada
+    RELOAD_INTERVAL segundos, e enquanto isso as consultas voltam para o
+    SQLite. Atualizações de linhas já carregadas não são vistas: quem
+    alterar carros fora do servidor deve chamar reload().
+    """
+
+    def __init__(self, reload_interval: float = RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._last_reload = None
+        self._last_attempt = None  # início da última carga em segundo plano
+        self._pool = None
+        self._loading = False
+        self._clear()
+
+    def _clear(self):
+        self._size = 0
+        self._watermark = 0
+        self._unbranded = 0    # carros sem marca (fora de brand_stats)
+        self._unsupported = 0  # valores que as colunas não representam exatamente
+        self._brands = _Dictionary()
+        self._models = _Dictionary()
+        self._known_days = {}
+        self._brand = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self._model = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self._price = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self._rating = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        # Chave de ordenação: -nota, com NULL no fim (como ORDER BY rating DESC no SQLite)
+        self._rank = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self._day = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+
+    def _reserve(self, extra: int):
+        """Garante espaço para mais extra linhas (ao menos dobrando a capacidade das colunas)."""
+        needed = self._size + extra
+        capacity = len(self._brand)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name in ("_brand", "_model", "_price", "_rating", "_rank", "_day"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            # As consultas em andamento continuam com as colunas antigas
+            setattr(self, name, new)
+
+    def _append(self, rows: list):
+        ids, brands, models, prices, ratings, dates = zip(*rows)
+        prices, bad_prices = _float_column(prices)
+        ratings, bad_ratings = _float_column(ratings)
+        days, bad_dates = _day_column(dates, self._known_days)
+
+        self._reserve(len(rows))
+        start, end = self._size, self._size + len(rows)
+        self._brand[start:end] = self._brands.encode(brands)
+        self._model[start:end] = self._models.encode(models)
+        self._price[start:end] = prices
+        self._rating[start:end] = ratings
+        self._rank[start:end] = np.where(np.isnan(ratings), np.inf, -ratings)
+        self._day[start:end] = days
+        # Só escreve além de _size: leitores que já copiaram as views não são afetados
+        self._size = end
+        self._watermark = ids[-1]
+        self._unbranded += brands.count(None)
+        self._unsupported += bad_prices + bad_ratings + bad_dates
+
+    def _catch_up(self, conn: sqlite3.Connection):
+        cursor = conn.execute(NEW_CARS_QUERY, (self._watermark,))
+        try:
+            while True:
+                rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+                if not rows:
+                    break
+                self._append(rows)
+        finally:
+            cursor.close()
+
+    def _in_sync(self, conn: sqlite3.Connection) -> bool:
+        max_id, branded, unbranded = conn.execute(CONSISTENCY_QUERY).fetchone()
+        return ((max_id or 0) == self._watermark and unbranded == self._unbranded
+                and branded == self._size - self._unbranded)
+
+    def _refresh(self, conn: sqlite3.Connection, background: bool = False) -> bool:
+        """Carrega o snapshot ou traz os carros novos; retorna False se ele não puder responder agora.
+
+        Com background (caminho das consultas), a carga completa nunca roda
+        aqui: ela é agendada em uma thread de fundo e a consulta vai para o SQLite.
+        """
+        # Uma única transação de leitura: os carros novos e a conferência veem o mesmo estado
+        conn.execute("BEGIN")
+        try:
+            if self._last_reload is None:
+                if background:
+                    self._schedule_reload()
+                    return False
+                with columnar_duration.time(operation="reload"):
+                    self._reload(conn)
+            else:
+                with columnar_duration.time(operation="refresh"):
+                    self._catch_up(conn)
+            if self._in_sync(conn):
+                return True
+            if time.monotonic() - self._last_reload < self.reload_interval:
+                return False
+            if background:
+                self._schedule_reload()
+                return False
+            with columnar_duration.time(operation="reload"):
+                self._reload(conn)
+            return self._in_sync(conn)
+        finally:
+            conn.rollback()
+
+    def _schedule_reload(self):
+        # Sem pool (snapshot usado direto, sem load_in_background) quem recarrega é o chamador de refresh()
+        if self._pool is None or self._loading:
+            return
+        if self._last_attempt is not None and time.monotonic() - self._last_attempt < self.reload_interval:
+            return
+        self.load_in_background(self._pool)
+
+    def _reload(self, conn: sqlite3.Connection):
+        start = time.perf_counter()
+        self._loading = True
+        try:
+            self._clear()
+            # Reserva de uma vez para todos os ids (mais uma folga), sem dobrar as colunas durante a carga
+            max_id = conn.execute("SELECT MAX(id) FROM cars").fetchone()[0] or 0
+            self._reserve(max_id + max_id // 8)
+            self._catch_up(conn)
+        finally:
+            self._loading = False
+        self._last_reload = time.monotonic()
+        self.reloads += 1
+        print(f"Snapshot colunar carregado: {self._size} carros, "
+              f"{self.memory_bytes() / 2**20:.0f} MB, {time.perf_counter() - start:.1f} s")
+        if self._unsupported:
+            print(f"Snapshot colunar desativado: {self._unsupported} valores fora do formato "
+                  "(preço/nota não numéricos ou data fora de AAAA-MM-DD); consultas vão para o SQLite.")
+
+    def reload(self, conn: sqlite3.Connection):
+        """Recarrega o snapshot do zero (por exemplo, depois de alterar carros fora do servidor)."""
+        with self._lock:
+            conn.execute("BEGIN")
+            try:
+                with columnar_duration.time(operation="reload"):
+                    self._reload(conn)
+            finally:
+                conn.rollback()
+
+    def load_in_background(self, pool):
+        """Carrega o snapshot em uma thread, com uma conexão do pool.
+
+        Até a carga terminar, filtered() devolve None e as consultas continuam
+        no SQLite, em vez de esperar (com milhões de carros a carga leva dezenas
+        de segundos). O pool fica guardado para as recargas que filtered()
+        agendar quando o snapshot divergir do banco.
+        """
+        self._pool = pool
+        self._last_attempt = time.monotonic()
+        self._loading = True
+
+        def load():
+            try:
+                with pool.connection() as conn:
+                    self.refresh(conn)
+            except sqlite3.Error as e:
+                print(f"Erro ao carregar o snapshot colunar: {e}")
+            finally:
+                self._loading = False
+
+        threading.Thread(target=load, name="columnar-load", daemon=True).start()
+
+    def refresh(self, conn: sqlite3.Connection) -> bool:
+        """Carrega o snapshot (na primeira chamada) ou traz os carros novos; True se estiver em dia."""
+        with self._lock:
+            return self._refresh(conn)
+
+    def memory_bytes(self) -> int:
+        """Memória ocupada pelas colunas (incluindo a capacidade reservada)."""
+        return sum(column.nbytes for column in (self._brand, self._model, self._price, self._rating, self._rank, self._day))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rows": self._size,
+                "watermark": self._watermark,
+                "memory_bytes": self.memory_bytes(),
+                "reloads": self.reloads,
+                "unsupported_values": self._unsupported,
+            }
+
+    def filtered(self, conn: sqlite3.Connection, brand: str = None, start_date: str = None,
+                 end_date: str = None, min_rating: float = None, limit: int = 10):
+        """Mesma resposta de get_cars_filtered, calculada sobre as colunas.
+
+        Retorna None quando a consulta deve ir para o SQLite: datas fora do
+        formato AAAA-MM-DD (que o SQLite compara como texto), valores que o
+        snapshot não representa, snapshot ainda carregando ou fora de
+        sincronia com o banco.
+        """
+        start_day = day_number(start_date) if start_date else None
+        end_day = day_number(end_date) if end_date else None
+        if (start_date and start_day is None) or (end_date and end_day is None):
+            return None
+
+        if self._loading:
+            return None
+        with self._lock:
+            if not self._refresh(conn, background=True) or self._unsupported:
+                return None
+            size = self._size
+            brand_code = self._brands.codes.get(brand) if brand else None
+            if brand and brand_code is None:
+                return []
+            # Views até size: escritas posteriores só usam posições depois dela
+            brand_column = self._brand[:size]
+            model_column = self._model[:size]
+            price_column = self._price[:size]
+            rating_column = self._rating[:size]
+            rank_column = self._rank[:size]
+            day_column = self._day[:size]
+            brand_names = self._brands.values
+            model_names = self._models.values
+
+        with columnar_duration.time(operation="query"):
+            masks = []
+            if brand:
+                masks.append(brand_column == brand_code)
+            if start_day is not None:
+                masks.append(day_column >= start_day)  # NO_DATE fica de fora
+            if end_day is not None:
+                masks.append((day_column <= end_day) & (day_column != NO_DATE))
+            if min_rating is not None:
+                masks.append(rating_column >= min_rating)  # NaN fica de fora
+            mask = np.logical_and.reduce(masks) if masks else None
+
+            if mask is None:
+                rows = _top_k(rank_column, limit)
+            else:
+                candidates = np.flatnonzero(mask)
+                rows = candidates[_top_k(rank_column[candidates], limit)]
+
+            days = day_column[rows]
+            dates = np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+            return [
+                {
+                    "brand": brand_names[b],
+                    "model": model_names[m],
+                    "price": None if math.isnan(p) else p,
+                    "rating": None if math.isnan(r) else r,
+                    "launch_date": None if d == NO_DATE else date,
+                }
+                for b, m, p, r, d, date in zip(
+                    brand_column[rows].tolist(), model_column[rows].tolist(), price_column[rows].tolist(),
+                    rating_column[rows].tolist(), days.tolist(), dates,
+                )
+            ]
+
+
+def _top_k(rank: np.ndarray, limit: int) -> np.ndarray:
+    """Posições das limit menores chaves de rank, em ordem (limit negativo = todas, como LIMIT -1)."""
+    if limit == 0 or not len(rank):
+        return np.empty(0, dtype=np.intp)
+    if 0 < limit < len(rank):
+        part = np.argpartition(rank, limit - 1)[:limit]
+        return part[np.argsort(rank[part], kind="stable")]
+    return np.argsort(rank, kind="stable")
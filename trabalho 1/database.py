@@ -0,0 +1,544 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Caminho do banco de dados (pode ser trocado via variável de ambiente)
+DB_PATH = os.environ.get("CARS_DB_PATH", "cars.db")
+
+# Tamanho do pool e do cache de prepared statements por conexão
+POOL_SIZE = int(os.environ.get("CARS_DB_POOL_SIZE", "8"))
+STATEMENT_CACHE_SIZE = 256
+
+# Tempo (s) que uma conexão espera por um lock antes de falhar
+BUSY_TIMEOUT = 5.0
+
+# Tempo (s) que uma requisição espera por uma conexão livre do pool antes de desistir
+POOL_TIMEOUT = float(os.environ.get("CARS_DB_POOL_TIMEOUT", "10"))
+
+# Pragmas aplicados uma única vez quando a conexão é aberta
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",     # leitores rodam junto com um escritor
+    "PRAGMA synchronous=NORMAL",   # seguro com WAL e bem mais rápido que FULL
+    "PRAGMA cache_size=-65536",    # 64 MB de page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB mapeados em memória
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Pragmas usados só durante bulk_load (desfeitos ao final, reaplicando PRAGMAS)
+BULK_PRAGMAS = (
+    "PRAGMA synchronous=OFF",  # uma queda do sistema pode perder o último bloco (e o checkpoint dele junto)
+    # Memória constante qualquer que seja o volume: a ordenação dos índices recriados
+    # transborda para arquivos temporários e o banco não é mapeado em memória
+    "PRAGMA temp_store=FILE",
+    "PRAGMA mmap_size=0",
+)
+
+
+def connect(db_path: str = None) -> sqlite3.Connection:
+    """Abre uma conexão já configurada com os pragmas de desempenho."""
+    conn = sqlite3.connect(
+        db_path or DB_PATH,
+        timeout=BUSY_TIMEOUT,
+        check_same_thread=False,  # a conexão circula entre threads pelo pool
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão do pool ficou livre dentro de POOL_TIMEOUT segundos."""
+
+
+class ConnectionPool:
+    """Pool limitado de conexões SQLite de longa duração.
+
+    Cada conexão é emprestada para uma única thread por vez, então o
+    cache de prepared statements do sqlite3 é reaproveitado entre
+    chamadas sem precisar de locks extras.
+    """
+
+    def __init__(self, db_path: str = None, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path or DB_PATH
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return connect(self.db_path)
+                except sqlite3.Error:
+                    self._opened -= 1
+                    raise
+        # Pool cheio: espera alguma conexão ser devolvida, mas não para sempre
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"Nenhuma conexão livre no pool após {self.timeout:g} s.") from None
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma conexão do pool e a devolve ao final do bloco."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Fecha todas as conexões ociosas do pool."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+# Pool compartilhado por todas as ferramentas MCP e rotas Flask
+pool = ConnectionPool()
+
+
+# Regras de um carro válido: usadas pelo servidor e pela importação em massa (cars_cli.py)
+def validate_car(brand: str, model: str, price: float, rating: float):
+    """Valida os dados de um carro, levantando ValueError se algum for inválido."""
+    if not brand or not model:
+        raise ValueError("Marca e modelo são obrigatórios.")
+    if price <= 0:
+        raise ValueError("Preço deve ser positivo.")
+    if not (0 <= rating <= 5):
+        raise ValueError("Nota deve estar entre 0 e 5.")
+
+
+# Índices secundários atuais da tabela cars (nome -> DDL). As migrações não
+# leem este dicionário: cada uma guarda a própria DDL, que não muda depois de aplicada
+INDEXES = {
+    # get_cars_by_brand e get_cars_filtered por marca, já ordenados por nota
+    "idx_cars_brand_rating": "CREATE INDEX IF NOT EXISTS idx_cars_brand_rating ON cars (brand, rating)",
+    # get_cars_by_model e search_cars (carros de um par marca/modelo, já ordenados por nota)
+    "idx_cars_model_brand_rating": "CREATE INDEX IF NOT EXISTS idx_cars_model_brand_rating ON cars (model, brand, rating)",
+    # get_cars_filtered por intervalo de datas
+    "idx_cars_launch_date_rating": "CREATE INDEX IF NOT EXISTS idx_cars_launch_date_rating ON cars (launch_date, rating)",
+    # get_cars_filtered sem marca/data: percorre as maiores notas primeiro
+    "idx_cars_rating": "CREATE INDEX IF NOT EXISTS idx_cars_rating ON cars (rating)",
+}
+
+
+def _column_names(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _migration_create_cars(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cars (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            brand TEXT,
+            model TEXT,
+            price REAL,
+            rating REAL,
+            launch_date TEXT
+        )
+    """)
+    # Bancos antigos foram criados antes da coluna launch_date
+    if "launch_date" not in _column_names(conn, "cars"):
+        conn.execute("ALTER TABLE cars ADD COLUMN launch_date TEXT")
+
+
+def _migration_create_indexes(conn: sqlite3.Connection):
+    # DDL congelada: mudanças de índice entram em migrações novas
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cars_brand_rating ON cars (brand, rating)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cars_model ON cars (model)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cars_launch_date_rating ON cars (launch_date, rating)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cars_rating ON cars (rating)")
+
+
+# Histograma de notas em faixas de 1 ponto: [0, 1), [1, 2), ..., [4, 5] (5 entra na última;
+# notas fora de 0-5 entram na faixa mais próxima)
+RATING_BUCKETS = 5
+RATING_BUCKET_COLUMNS = [f"rating_bucket_{i}" for i in range(RATING_BUCKETS)]
+
+# Tabelas de resumo, com uma linha por marca: varrê-las inteiras é o plano esperado
+SUMMARY_TABLES = {"brand_stats"}
+
+# Plano de tabela virtual que usa alguma restrição (o texto depois de "N:" não é vazio)
+_VIRTUAL_TABLE_LOOKUP = re.compile(r" VIRTUAL TABLE INDEX \d+:\S")
+
+
+def _rating_bucket(rating: str) -> str:
+    """Expressão SQL com a faixa da nota (NULL se a nota for NULL)."""
+    return f"MAX(MIN(CAST({rating} AS INTEGER), {RATING_BUCKETS - 1}), 0)"
+
+
+def _brand_stats_upsert(row: str, sign: str) -> str:
+    """UPSERT que soma (sign '+') ou subtrai (sign '-') o carro row (NEW ou OLD) do resumo da marca."""
+    buckets = ", ".join(
+        f"(CASE WHEN {_rating_bucket(row + '.rating')} = {i} THEN {sign}1 ELSE 0 END)"
+        for i in range(RATING_BUCKETS)
+    )
+    bucket_updates = "".join(
+        f", {column} = {column} + excluded.{column}" for column in RATING_BUCKET_COLUMNS
+    )
+    return f"""
+        INSERT INTO brand_stats (brand, car_count, price_count, price_sum, rating_count, rating_sum,
+                                 {", ".join(RATING_BUCKET_COLUMNS)})
+        VALUES ({row}.brand, {sign}1,
+                {sign}({row}.price IS NOT NULL), {sign}COALESCE({row}.price, 0),
+                {sign}({row}.rating IS NOT NULL), {sign}COALESCE({row}.rating, 0),
+                {buckets})
+        ON CONFLICT (brand) DO UPDATE SET
+            car_count = car_count + excluded.car_count,
+            price_count = price_count + excluded.price_count,
+            price_sum = price_sum + excluded.price_sum,
+            rating_count = rating_count + excluded.rating_count,
+            rating_sum = rating_sum + excluded.rating_sum{bucket_updates};
+        DELETE FROM brand_stats WHERE brand = {row}.brand AND car_count <= 0;
+    """
+
+
+# Gatilhos que mantêm brand_stats em dia a cada escrita em cars (nome -> DDL)
+BRAND_STATS_TRIGGERS = {
+    "trg_cars_brand_stats_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cars_brand_stats_insert
+        AFTER INSERT ON cars WHEN NEW.brand IS NOT NULL
+        BEGIN {_brand_stats_upsert("NEW", "+")} END
+    """,
+    "trg_cars_brand_stats_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cars_brand_stats_delete
+        AFTER DELETE ON cars WHEN OLD.brand IS NOT NULL
+        BEGIN {_brand_stats_upsert("OLD", "-")} END
+    """,
+    # Atualização = remove a versão antiga e soma a nova (cada uma só se tiver marca)
+    "trg_cars_brand_stats_update_old": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cars_brand_stats_update_old
+        AFTER UPDATE OF brand, price, rating ON cars WHEN OLD.brand IS NOT NULL
+        BEGIN {_brand_stats_upsert("OLD", "-")} END
+    """,
+    "trg_cars_brand_stats_update_new": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cars_brand_stats_update_new
+        AFTER UPDATE OF brand, price, rating ON cars WHEN NEW.brand IS NOT NULL
+        BEGIN {_brand_stats_upsert("NEW", "+")} END
+    """,
+}
+
+
+def rebuild_brand_stats(conn: sqlite3.Connection):
+    """Recalcula brand_stats do zero a partir de cars (uma varredura da tabela).
+
+    Usado ao criar o resumo em um banco que já tem dados e depois de cargas
+    feitas com os gatilhos desligados.
+    """
+    buckets = ", ".join(
+        f"SUM({_rating_bucket('rating')} IS {i})" for i in range(RATING_BUCKETS)
+    )
+    conn.execute("DELETE FROM brand_stats")
+    conn.execute(f"""
+        INSERT INTO brand_stats (brand, car_count, price_count, price_sum, rating_count, rating_sum,
+                                 {", ".join(RATING_BUCKET_COLUMNS)})
+        SELECT brand, COUNT(*), COUNT(price), TOTAL(price), COUNT(rating), TOTAL(rating), {buckets}
+        FROM cars WHERE brand IS NOT NULL GROUP BY brand
+    """)
+
+
+def _migration_create_brand_stats(conn: sqlite3.Connection):
+    bucket_columns = "".join(f", {column} INTEGER NOT NULL DEFAULT 0" for column in RATING_BUCKET_COLUMNS)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS brand_stats (
+            brand TEXT PRIMARY KEY,
+            car_count INTEGER NOT NULL,
+            price_count INTEGER NOT NULL,
+            price_sum REAL NOT NULL,
+            rating_count INTEGER NOT NULL,
+            rating_sum REAL NOT NULL{bucket_columns}
+        ) WITHOUT ROWID
+    """)
+    for ddl in BRAND_STATS_TRIGGERS.values():
+        conn.execute(ddl)
+    rebuild_brand_stats(conn)
+
+
+# Vocabulário de nomes (marca, modelo) distintos, com índice FTS5 de trigramas.
+# A busca aproximada roda sobre os nomes distintos (poucos, mesmo com milhões de
+# carros) e só depois busca os carros dos nomes encontrados pelos índices de cars.
+CAR_NAMES_TRIGGERS = {
+    "trg_cars_names_insert": """
+        CREATE TRIGGER IF NOT EXISTS trg_cars_names_insert
+        AFTER INSERT ON cars WHEN NEW.brand IS NOT NULL AND NEW.model IS NOT NULL
+        BEGIN
+            INSERT INTO car_names (brand, model, car_count) VALUES (NEW.brand, NEW.model, 1)
+            ON CONFLICT (brand, model) DO UPDATE SET car_count = car_count + 1;
+        END
+    """,
+    "trg_cars_names_delete": """
+        CREATE TRIGGER IF NOT EXISTS trg_cars_names_delete
+        AFTER DELETE ON cars WHEN OLD.brand IS NOT NULL AND OLD.model IS NOT NULL
+        BEGIN
+            UPDATE car_names SET car_count = car_count - 1 WHERE brand = OLD.brand AND model = OLD.model;
+            DELETE FROM car_names WHERE brand = OLD.brand AND model = OLD.model AND car_count <= 0;
+        END
+    """,
+    "trg_cars_names_update_old": """
+        CREATE TRIGGER IF NOT EXISTS trg_cars_names_update_old
+        AFTER UPDATE OF brand, model ON cars WHEN OLD.brand IS NOT NULL AND OLD.model IS NOT NULL
+        BEGIN
+            UPDATE car_names SET car_count = car_count - 1 WHERE brand = OLD.brand AND model = OLD.model;
+            DELETE FROM car_names WHERE brand = OLD.brand AND model = OLD.model AND car_count <= 0;
+        END
+    """,
+    "trg_cars_names_update_new": """
+        CREATE TRIGGER IF NOT EXISTS trg_cars_names_update_new
+        AFTER UPDATE OF brand, model ON cars WHEN NEW.brand IS NOT NULL AND NEW.model IS NOT NULL
+        BEGIN
+            INSERT INTO car_names (brand, model, car_count) VALUES (NEW.brand, NEW.model, 1)
+            ON CONFLICT (brand, model) DO UPDATE SET car_count = car_count + 1;
+        END
+    """,
+    # Índice FTS de conteúdo externo: acompanha só a criação e a remoção de nomes
+    "trg_car_names_fts_insert": """
+        CREATE TRIGGER IF NOT EXISTS trg_car_names_fts_insert AFTER INSERT ON car_names
+        BEGIN
+            INSERT INTO car_names_fts (rowid, brand, model) VALUES (NEW.id, NEW.brand, NEW.model);
+        END
+    """,
+    "trg_car_names_fts_delete": """
+        CREATE TRIGGER IF NOT EXISTS trg_car_names_fts_delete AFTER DELETE ON car_names
+        BEGIN
+            INSERT INTO car_names_fts (car_names_fts, rowid, brand, model) VALUES ('delete', OLD.id, OLD.brand, OLD.model);
+        END
+    """,
+}
+
+
+def rebuild_car_names(conn: sqlite3.Connection):
+    """Recalcula car_names e o índice FTS a partir de cars."""
+    conn.execute("DELETE FROM car_names")
+    conn.execute("""
+        INSERT INTO car_names (brand, model, car_count)
+        SELECT brand, model, COUNT(*) FROM cars
+        WHERE brand IS NOT NULL AND model IS NOT NULL GROUP BY brand, model
+    """)
+    conn.execute("INSERT INTO car_names_fts (car_names_fts) VALUES ('rebuild')")
+
+
+def _migration_create_car_names_fts(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS car_names (
+            id INTEGER PRIMARY KEY,
+            brand TEXT NOT NULL,
+            model TEXT NOT NULL,
+            car_count INTEGER NOT NULL,
+            UNIQUE (brand, model)
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS car_names_fts USING fts5(
+            brand, model, content='car_names', content_rowid='id', tokenize='trigram'
+        )
+    """)
+    for ddl in CAR_NAMES_TRIGGERS.values():
+        conn.execute(ddl)
+    rebuild_car_names(conn)
+
+
+# Gatilhos disparados por escritas em cars (os de car_names ficam sempre ativos)
+CARS_TRIGGERS = {
+    **BRAND_STATS_TRIGGERS,
+    **{name: ddl for name, ddl in CAR_NAMES_TRIGGERS.items() if name.startswith("trg_cars_")},
+}
+
+
+@contextmanager
+def bulk_load(conn: sqlite3.Connection):
+    """Prepara cars para uma carga grande: sem índices secundários nem gatilhos.
+
+    Ao sair do bloco (mesmo com erro), confirma o que foi gravado, recria
+    índices e gatilhos e recalcula os resumos (brand_stats e car_names) com
+    uma varredura só, em vez de uma atualização por linha inserida. Durante o
+    bloco a conexão usa BULK_PRAGMAS.
+    """
+    conn.commit()
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    for name in CARS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    try:
+        yield conn
+    finally:
+        conn.commit()
+        with conn:
+            for ddl in INDEXES.values():
+                conn.execute(ddl)
+            for ddl in CARS_TRIGGERS.values():
+                conn.execute(ddl)
+            rebuild_brand_stats(conn)
+            rebuild_car_names(conn)
+        conn.execute("PRAGMA optimize")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+
+
+def _migration_index_model_brand_rating(conn: sqlite3.Connection):
+    # idx_cars_model é prefixo do novo índice
+    conn.execute("DROP INDEX IF EXISTS idx_cars_model")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cars_model_brand_rating ON cars (model, brand, rating)")
+
+
+def _migration_add_year_mileage(conn: sqlite3.Connection):
+    # Campos "ano" e "kilometragem" da especificação em lista
+    columns = _column_names(conn, "cars")
+    if "year" not in columns:
+        conn.execute("ALTER TABLE cars ADD COLUMN year INTEGER")
+    if "mileage" not in columns:
+        conn.execute("ALTER TABLE cars ADD COLUMN mileage REAL")
+
+
+def _migration_create_import_checkpoints(conn: sqlite3.Connection):
+    # Progresso das importações do cars_cli.py, gravado na mesma transação de cada bloco
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            byte_offset INTEGER NOT NULL,
+            records INTEGER NOT NULL,
+            inserted INTEGER NOT NULL,
+            rejected INTEGER NOT NULL,
+            finished INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_create_image_jobs(conn: sqlite3.Connection):
+    # Fila durável de análise de imagens (job_queue.py); horários em segundos (time.time())
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            image_path TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            result TEXT,
+            car_id INTEGER,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+    """)
+    # Próximo job da fila, contagem de pendentes e posses vencidas
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs (status, id)")
+
+
+# Migrações em ordem; a posição (a partir de 1) é a versão gravada em user_version
+MIGRATIONS = [
+    _migration_create_cars,
+    _migration_create_indexes,
+    _migration_create_brand_stats,
+    _migration_create_car_names_fts,
+    _migration_index_model_brand_rating,
+    _migration_add_year_mileage,
+    _migration_create_import_checkpoints,
+    _migration_create_image_jobs,
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Aplica as migrações pendentes, cada uma em sua própria transação.
+
+    A versão do esquema fica em PRAGMA user_version. Retorna a versão final.
+    """
+    version = schema_version(conn)
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Outro processo pode ter migrado enquanto esperávamos o lock
+            if schema_version(conn) >= target:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    if version < len(MIGRATIONS):
+        conn.execute("PRAGMA optimize")
+    return schema_version(conn)
+
+
+def full_scans(conn: sqlite3.Connection, query: str, params=()) -> list:
+    """Retorna as linhas de EXPLAIN QUERY PLAN que varrem uma tabela inteira sem índice.
+
+    Varreduras das tabelas de resumo (SUMMARY_TABLES), consultas a tabelas
+    virtuais com restrição (ex: MATCH no FTS5) e o SELECT sem FROM (SCAN
+    CONSTANT ROW) não contam.
+    """
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return [
+        row[3] for row in plan
+        if row[3].startswith("SCAN ") and " USING " not in row[3] and row[3] != "SCAN CONSTANT ROW"
+        and row[3].split()[1] not in SUMMARY_TABLES
+        and not _VIRTUAL_TABLE_LOOKUP.search(row[3])
+    ]
+
+
+def _schema_copy(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Cria um banco em memória só com tabelas e índices (sem dados nem sqlite_stat1)."""
+    copy = sqlite3.connect(":memory:")
+    rows = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('table', 'index') "
+        "AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+    ).fetchall()
+    for (sql,) in rows:
+        try:
+            copy.execute(sql)
+        except sqlite3.OperationalError as e:
+            # Tabelas-sombra de tabelas virtuais já são criadas junto com elas
+            if "already exists" not in str(e):
+                raise
+    return copy
+
+
+def check_query_plans(conn: sqlite3.Connection, queries: dict):
+    """Garante que nenhuma consulta (nome -> (sql, params)) caia em full table scan.
+
+    Os planos são avaliados sobre uma cópia do esquema sem estatísticas, para
+    que o resultado dependa só dos índices existentes e não do volume atual de
+    dados. Levanta RuntimeError listando todas as consultas problemáticas.
+    """
+    copy = _schema_copy(conn)
+    problems = []
+    try:
+        for name, (query, params) in queries.items():
+            for detail in full_scans(copy, query, params):
+                problems.append(f"{name}: {detail}  <- {query}")
+    finally:
+        copy.close()
+    if problems:
+        raise RuntimeError("Consultas sem índice detectadas:\n" + "\n".join(problems))
@@ -1,32 +1,311 @@
 import cv2
 import numpy as np
+import os
 import pytesseract
 import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from ocr_cache import OCR_CACHE_ENABLED, OcrCache, image_digest
+import metrics
 
-def analyze_image(image_path: str) -> tuple:
-    """Analisa a imagem e retorna a marca, modelo, preço e nota do carro."""
+# Extensões consideradas ao analisar uma pasta de imagens
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
+
+# Versão do pipeline de pré-processamento/OCR. Incremente ao mudar qualquer
+# etapa que altere o texto extraído: invalida o cache de resultados de OCR.
+PIPELINE_VERSION = 3
+
+# Configuração padrão das etapas de pré-processamento (variáveis de ambiente)
+OCR_REDUCE_FACTOR = int(os.environ.get("OCR_REDUCE_FACTOR", "2"))
+OCR_TARGET_TEXT_HEIGHT = int(os.environ.get("OCR_TARGET_TEXT_HEIGHT", "32"))
+OCR_CROP_REGIONS = os.environ.get("OCR_CROP_REGIONS", "1") != "0"
+
+# Idiomas do OCR e backend usado: 'auto', 'tesserocr' ou 'pytesseract'
+OCR_LANG = 'por+eng'
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto")
+
+class PytesseractBackend:
+    """OCR via pytesseract: grava a imagem em arquivo temporário e abre um processo tesseract por chamada."""
+    name = "pytesseract"
+    # Cada chamada custa um processo e a leitura dos traineddata: as regiões vão juntas em uma imagem
+    stack_regions = True
+
+    def __init__(self, lang: str = OCR_LANG):
+        self.lang = lang
+
+    def image_to_string(self, image: np.ndarray) -> str:
+        return pytesseract.image_to_string(image, lang=self.lang)
+
+class TesserocrBackend:
+    """OCR via API C do Tesseract (pacote tesserocr).
+
+    O motor e os traineddata são carregados uma única vez e o buffer do
+    NumPy é passado direto, sem arquivo temporário nem subprocesso. Uma
+    instância não pode ser usada por duas threads ao mesmo tempo.
+    """
+    name = "tesserocr"
+    # Chamadas baratas (motor já carregado): cada região é lida separadamente
+    stack_regions = False
+
+    def __init__(self, lang: str = OCR_LANG):
+        import tesserocr  # dependência opcional
+        self._api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def image_to_string(self, image: np.ndarray) -> str:
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        self._api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, image.strides[0])
+        return self._api.GetUTF8Text()
+
+    def close(self):
+        self._api.End()
+
+OCR_BACKENDS = {
+    "tesserocr": TesserocrBackend,
+    "pytesseract": PytesseractBackend,
+}
+
+_local = threading.local()
+
+def create_ocr_backend(name: str = None):
+    """Cria um backend de OCR; em 'auto', usa tesserocr se disponível e cai para pytesseract."""
+    name = name or OCR_BACKEND
+    if name != "auto":
+        return OCR_BACKENDS[name]()
     try:
-        # Carregar a imagem
-        image = cv2.imread(image_path)
-        if image is None:
+        return TesserocrBackend()
+    except (ImportError, RuntimeError) as e:
+        print(f"tesserocr indisponível ({e}); usando pytesseract.")
+        return PytesseractBackend()
+
+def get_ocr_backend():
+    """Retorna o backend de OCR da thread atual, criado na primeira chamada e reaproveitado depois."""
+    backend = getattr(_local, "ocr_backend", None)
+    if backend is None:
+        backend = _local.ocr_backend = create_ocr_backend()
+    return backend
+
+# Flags de decodificação reduzida do OpenCV (o JPEG é decodificado já em escala menor)
+_REDUCED_GRAYSCALE = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+class ImagePipeline:
+    """Pipeline de pré-processamento e OCR em etapas, cada uma com seu tempo medido.
+
+    Etapas: decode (com IMREAD_REDUCED_* em fotos grandes), regions (detecção
+    morfológica de linhas de texto), resize (escala para a altura de texto
+    alvo), threshold (Otsu por região), ocr e parse. O texto das regiões é
+    juntado linha a linha, no mesmo formato esperado por extract_value,
+    extract_price e extract_rating. Com backends de chamada cara
+    (pytesseract, um processo por chamada), as regiões são empilhadas em
+    uma única imagem e o OCR roda uma vez só.
+    """
+
+    # Abaixo deste lado menor, a imagem é decodificada em resolução cheia
+    MIN_DECODED_SIDE = 800
+    # Fator de escala permitido na etapa resize
+    MIN_SCALE, MAX_SCALE = 0.25, 3.0
+    # Região precisa ter pelo menos esta altura (px) para ser considerada texto
+    MIN_REGION_HEIGHT = 6
+    MAX_REGIONS = 40
+
+    def __init__(self, reduce_factor: int = OCR_REDUCE_FACTOR, target_text_height: int = OCR_TARGET_TEXT_HEIGHT,
+                 crop_regions: bool = OCR_CROP_REGIONS):
+        if reduce_factor not in _REDUCED_GRAYSCALE:
+            raise ValueError("reduce_factor deve ser 1, 2, 4 ou 8.")
+        self.reduce_factor = reduce_factor
+        self.target_text_height = target_text_height
+        self.crop_regions = crop_regions
+
+    def signature(self) -> str:
+        """Identifica versão, configuração e backend de OCR do pipeline (faz parte da chave do cache de OCR)."""
+        return (f"{PIPELINE_VERSION}:r{self.reduce_factor}:h{self.target_text_height}:c{int(self.crop_regions)}"
+                f":{get_ocr_backend().name}")
+
+    def decode(self, data: bytes) -> np.ndarray:
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        gray = cv2.imdecode(buffer, _REDUCED_GRAYSCALE[self.reduce_factor])
+        # Imagens pequenas (prints de anúncio) perderiam legibilidade reduzidas
+        if gray is not None and self.reduce_factor > 1 and min(gray.shape[:2]) < self.MIN_DECODED_SIDE:
+            gray = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
             raise ValueError("Imagem não pôde ser carregada.")
+        return gray
 
-        # Pré-processamento da imagem para melhorar OCR
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    def detect_text_regions(self, gray: np.ndarray) -> list:
+        """Retorna retângulos (x, y, w, h) de linhas de texto, em ordem de leitura."""
+        height, width = gray.shape[:2]
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+        binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+        # Une as letras de uma mesma linha em um único bloco
+        line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, width // 40), 1))
+        connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, line_kernel)
+        contours = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
 
-        # Extrair texto da imagem usando OCR
-        text = pytesseract.image_to_string(gray, lang='por+eng')  # Suporte para português e inglês
+        regions = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if h < self.MIN_REGION_HEIGHT or w < h or h > height // 2:
+                continue
+            pad = max(2, h // 4)
+            x0, y0 = max(0, x - pad), max(0, y - pad)
+            x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+            regions.append((x0, y0, x1 - x0, y1 - y0))
+        regions.sort(key=lambda r: (r[1], r[0]))
+        return regions[:self.MAX_REGIONS]
 
-        # Parsear o texto extraído para encontrar marca, modelo, preço e nota
-        brand = extract_value(text, ['marca', 'brand'], default="Desconhecida")
-        model = extract_value(text, ['modelo', 'model'], default="Desconhecido")
-        price = extract_price(text)
-        rating = extract_rating(text)
+    def text_scale(self, regions: list) -> float:
+        """Fator que leva a altura mediana das regiões para target_text_height."""
+        if not regions:
+            return 1.0
+        median_height = float(np.median([h for _, _, _, h in regions]))
+        scale = self.target_text_height / median_height
+        return min(max(scale, self.MIN_SCALE), self.MAX_SCALE)
 
-        return brand, model, price, rating
+    def stack(self, crops: list) -> np.ndarray:
+        """Empilha as regiões binarizadas em uma imagem, com texto escuro sobre fundo branco e uma faixa entre elas."""
+        gap = self.target_text_height
+        width = max(crop.shape[1] for crop in crops)
+        rows = []
+        for crop in crops:
+            # Otsu deixa texto claro em fundo escuro quando a região é assim: inverte para o padrão do Tesseract
+            if crop.mean() < 127:
+                crop = 255 - crop
+            rows.append(cv2.copyMakeBorder(crop, 0, gap, gap, gap + width - crop.shape[1],
+                                           cv2.BORDER_CONSTANT, value=255))
+        return cv2.copyMakeBorder(np.vstack(rows), gap, 0, 0, 0, cv2.BORDER_CONSTANT, value=255)
+
+    def run(self, gray: np.ndarray, timings: dict = None, backend=None) -> str:
+        """Executa as etapas a partir da imagem em tons de cinza e retorna o texto extraído.
+
+        backend substitui o backend de OCR da thread (usado nos benchmarks).
+        """
+        timings = {} if timings is None else timings
+
+        start = time.perf_counter()
+        regions = self.detect_text_regions(gray) if self.crop_regions else []
+        timings["regions"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        scale = self.text_scale(regions)
+        # Sem regiões detectadas, o OCR roda na imagem inteira
+        crops = [gray[y:y + h, x:x + w] for x, y, w, h in regions] or [gray]
+        if scale != 1.0:
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+            crops = [cv2.resize(crop, None, fx=scale, fy=scale, interpolation=interpolation) for crop in crops]
+        timings["resize"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        crops = [cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1] for crop in crops]
+        timings["threshold"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        backend = backend or get_ocr_backend()
+        if len(crops) > 1 and backend.stack_regions:
+            crops = [self.stack(crops)]
+        text = "\n".join(backend.image_to_string(crop).strip() for crop in crops)
+        timings["ocr"] = (time.perf_counter() - start) * 1000
+        return text
 
+_pipeline = None
+
+def get_pipeline() -> ImagePipeline:
+    """Retorna o pipeline configurado pelas variáveis de ambiente."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = ImagePipeline()
+    return _pipeline
+
+_ocr_cache = None
+_ocr_cache_pid = None
+
+def get_ocr_cache():
+    """Retorna o cache de OCR deste processo (ou None se estiver desligado)."""
+    global _ocr_cache, _ocr_cache_pid
+    if not OCR_CACHE_ENABLED:
+        return None
+    # Conexões SQLite não podem atravessar um fork: cada processo abre a sua
+    if _ocr_cache is None or _ocr_cache_pid != os.getpid():
+        _ocr_cache = OcrCache(pipeline_version=get_pipeline().signature())
+        _ocr_cache_pid = os.getpid()
+    return _ocr_cache
+
+def record_ocr_metrics(timings: dict, cached: bool):
+    """Registra no registro de métricas do processo o tempo de cada etapa de uma imagem."""
+    metrics.ocr_images.inc(cached=cached)
+    metrics.record_stage_timings(metrics.ocr_stage_duration, timings)
+
+def analyze_image_detailed(image_path: str) -> dict:
+    """Analisa a imagem e retorna o resultado junto com o texto extraído e o tempo de cada etapa.
+
+    Chaves: result (marca, modelo, preço, nota), text, cached e timings
+    (milissegundos por etapa). Levanta exceção em caso de falha. Imagens
+    já vistas com a mesma configuração de pipeline vêm do cache de OCR,
+    sem passar por OpenCV nem Tesseract.
+    """
+    timings = {}
+    start = time.perf_counter()
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    timings["read"] = (time.perf_counter() - start) * 1000
+
+    cache = get_ocr_cache()
+    if cache is not None:
+        start = time.perf_counter()
+        digest = image_digest(data)
+        cached = cache.get(digest)
+        timings["cache"] = (time.perf_counter() - start) * 1000
+        if cached is not None:
+            text, result = cached
+            record_ocr_metrics(timings, cached=True)
+            return {"result": result, "text": text, "cached": True, "timings": timings}
+
+    pipeline = get_pipeline()
+    start = time.perf_counter()
+    gray = pipeline.decode(data)
+    timings["decode"] = (time.perf_counter() - start) * 1000
+
+    text = pipeline.run(gray, timings)
+
+    start = time.perf_counter()
+    result = parse_car_text(text)
+    timings["parse"] = (time.perf_counter() - start) * 1000
+
+    if cache is not None:
+        cache.put(digest, text, result)
+    record_ocr_metrics(timings, cached=False)
+    return {"result": result, "text": text, "cached": False, "timings": timings}
+
+def analyze_image_strict(image_path: str) -> tuple:
+    """Analisa a imagem e retorna (marca, modelo, preço, nota), levantando exceção em caso de falha."""
+    return analyze_image_detailed(image_path)["result"]
+
+def parse_car_text(text: str) -> tuple:
+    """Parseia o texto extraído para encontrar marca, modelo, preço e nota."""
+    brand = extract_value(text, ['marca', 'brand'], default="Desconhecida")
+    model = extract_value(text, ['modelo', 'model'], default="Desconhecido")
+    price = extract_price(text)
+    rating = extract_rating(text)
+
+    return brand, model, price, rating
+
+def analyze_image(image_path: str) -> tuple:
+    """Analisa a imagem e retorna a marca, modelo, preço e nota do carro."""
+    try:
+        return analyze_image_strict(image_path)
     except Exception as e:
+        metrics.record_error("analyze_image", e)
         print(f"Erro ao analisar imagem: {e}. Usando valores padrão.")
         # Fallback para valores fictícios
         brand = "Marca Exemplo"
@@ -35,6 +314,91 @@ def analyze_image(image_path: str) -> tuple:
         rating = 4.5
         return brand, model, price, rating
 
+def _init_worker():
+    # Cada processo já é um núcleo; evita que o OpenCV abra threads extras
+    cv2.setNumThreads(1)
+    # Carrega o motor de OCR uma vez por processo, antes da primeira imagem
+    get_ocr_backend()
+
+def _analyze_in_worker(image_path: str) -> tuple:
+    # As métricas do processo filho se perdem: os tempos voltam para o processo principal registrar
+    try:
+        details = analyze_image_detailed(image_path)
+        return image_path, details["result"], None, details["timings"], details["cached"]
+    except Exception as e:
+        return image_path, None, f"{type(e).__name__}: {e}", None, None
+
+def _report(outcome: tuple) -> tuple:
+    path, result, error, timings, cached = outcome
+    if timings is not None:
+        record_ocr_metrics(timings, cached)
+    else:
+        metrics.errors.inc(component="analyze_image", type=error.partition(":")[0])
+    return path, result, error
+
+def _run_pool(pending: deque, workers: int):
+    # Mantém no máximo `workers` imagens submetidas: se um processo morrer, só elas são suspeitas
+    suspects = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        in_flight = {}
+        while pending or in_flight:
+            while pending and len(in_flight) < workers:
+                path = pending.popleft()
+                in_flight[executor.submit(_analyze_in_worker, path)] = path
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                try:
+                    outcome = future.result()
+                except BrokenProcessPool:
+                    suspects.append(path)
+                    continue
+                yield _report(outcome)
+            if suspects:
+                # O pool quebrado derruba todas as imagens em andamento
+                suspects.extend(in_flight.values())
+                return suspects
+    return suspects
+
+def _run_alone(path: str) -> tuple:
+    # Processo só para esta imagem: se ele cair, a culpa é dela
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker) as executor:
+        try:
+            return executor.submit(_analyze_in_worker, path).result()
+        except BrokenProcessPool:
+            return path, None, "BrokenProcessPool: o processo de análise caiu com esta imagem", None, None
+
+def analyze_images(paths, workers: int = None):
+    """Analisa várias imagens em paralelo usando um pool de processos.
+
+    Gera tuplas (caminho, resultado, erro) à medida que cada imagem termina,
+    fora da ordem de entrada. Em caso de sucesso, resultado é a tupla
+    (marca, modelo, preço, nota) e erro é None; se a imagem falhar,
+    resultado é None e erro descreve a falha, sem interromper as demais.
+    Se um processo do pool morrer (falha de segmentação no OCR, falta de
+    memória), as imagens que estavam em andamento são refeitas uma a uma,
+    em processos separados, e só a que derrubar o processo de novo volta
+    com erro; as demais seguem em um pool novo.
+    """
+    pending = deque(paths)
+    if not pending:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    while pending:
+        suspects = yield from _run_pool(pending, workers)
+        if suspects:
+            print(f"Aviso: um processo de análise caiu; refazendo {len(suspects)} imagem(ns) em separado.")
+        for path in suspects:
+            yield _report(_run_alone(path))
+
+def list_images(directory: str) -> list:
+    """Lista, em ordem alfabética, os arquivos de imagem de uma pasta."""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
 def extract_value(text: str, keywords: list, default: str) -> str:
     """Extrai valor baseado em palavras-chave."""
     text_lower = text.lower()
@@ -84,3 +448,13 @@ def extract_rating(text: str) -> float:
             except ValueError:
                 pass
     return 4.0  # Valor padrão
+
+if __name__ == "__main__":
+    import sys
+
+    # Mostra o resultado e o tempo de cada etapa para as imagens informadas
+    for path in sys.argv[1:]:
+        details = analyze_image_detailed(path)
+        stages = ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in details["timings"].items())
+        origin = "cache" if details["cached"] else "pipeline"
+        print(f"{path}: {details['result']} [{origin}] {stages}")
@@ -0,0 +1,282 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+
+# Configuração (variáveis de ambiente)
+# Threads que processam jobs em cada processo do servidor (0 = só enfileira)
+JOB_WORKERS = int(os.environ.get("CARS_JOB_WORKERS", "2"))
+# Jobs pendentes (na fila ou em andamento) aceitos antes de responder 503
+JOB_QUEUE_MAX = int(os.environ.get("CARS_JOB_QUEUE_MAX", "1000"))
+# Validade (s) da posse de um job; renovada pelo heartbeat enquanto o worker estiver vivo
+JOB_LEASE_SECONDS = float(os.environ.get("CARS_JOB_LEASE_SECONDS", "60"))
+# Tentativas por job antes de marcá-lo como falho (cada queda de worker conta uma)
+JOB_MAX_ATTEMPTS = int(os.environ.get("CARS_JOB_MAX_ATTEMPTS", "3"))
+
+# Espera máxima (s) de um worker ocioso antes de procurar jobs de novo (jobs de outros processos)
+POLL_INTERVAL = 1.0
+
+JOB_COLUMNS = "id, status, image_path, attempts, result, car_id, error, created_at, started_at, finished_at"
+
+PENDING_COUNT_QUERY = "SELECT COUNT(*) FROM image_jobs WHERE status IN ('queued', 'running')"
+
+# Pega o job mais antigo da fila em uma única instrução (só um worker consegue cada job)
+CLAIM_QUERY = """
+    UPDATE image_jobs
+    SET status = 'running', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, started_at = ?
+    WHERE id = (SELECT id FROM image_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+    RETURNING id, image_path, attempts, created_at
+"""
+
+# Devolve à fila (ou dá como falhos) os jobs cujo worker parou de renovar a posse
+EXPIRED_LEASES_QUERY = "SELECT id, attempts, image_path FROM image_jobs WHERE status = 'running' AND lease_expires < ?"
+
+job_outcomes = metrics.registry.counter(
+    "cars_image_jobs_total", "Jobs de análise de imagem por resultado (done, failed, retried, expired).")
+job_duration = metrics.registry.histogram(
+    "cars_image_job_duration_seconds", "Tempo dos jobs de análise de imagem na fila (wait) e em execução (run).")
+
+
+class QueueFull(Exception):
+    """A fila atingiu JOB_QUEUE_MAX jobs pendentes."""
+
+
+class LeaseLost(Exception):
+    """O job deixou de pertencer a este worker (a posse expirou e outro o pegou)."""
+
+
+def _discard_image(path: str):
+    # A imagem só serve para o job: depois de done/failed ninguém mais a lê
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Erro ao apagar a imagem {path}: {e}")
+
+
+def _job_dict(row) -> dict:
+    job = dict(zip([column.strip() for column in JOB_COLUMNS.split(",")], row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class ImageJobQueue:
+    """Fila durável de jobs de análise de imagem, na tabela image_jobs do banco de carros.
+
+    Um job passa por queued -> running -> done/failed. O worker que pega um
+    job recebe a posse por JOB_LEASE_SECONDS e a renova com heartbeats; se o
+    processo morrer, a posse expira e o job volta para a fila (até
+    JOB_MAX_ATTEMPTS tentativas). A conclusão é gravada na mesma transação
+    que insere o carro, e só vale se a posse ainda for do worker: um job
+    nunca gera dois carros. Quando um job é dado como falho, a imagem
+    enviada é apagada (na conclusão, quem apaga é o handler).
+    """
+
+    def __init__(self, pool, max_pending: int = JOB_QUEUE_MAX, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Identifica este processo como dono dos jobs que pegar
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Condition()
+
+    def enqueue(self, image_path: str) -> int:
+        """Coloca um job na fila e retorna o id; levanta QueueFull se houver max_pending pendentes."""
+        with self.pool.connection() as conn:
+            # BEGIN IMMEDIATE: a contagem e a inserção não se intercalam com outro processo
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                pending = conn.execute(PENDING_COUNT_QUERY).fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueFull(f"Fila cheia ({pending} jobs pendentes).")
+                job_id = conn.execute(
+                    "INSERT INTO image_jobs (status, image_path, attempts, created_at) VALUES ('queued', ?, 0, ?)",
+                    (image_path, time.time()),
+                ).lastrowid
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: int):
+        """Retorna o job como dicionário, ou None se não existir."""
+        with self.pool.connection() as conn:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM image_jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def pending(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(PENDING_COUNT_QUERY).fetchone()[0]
+
+    def claim(self):
+        """Pega o próximo job da fila para este processo; None se a fila estiver vazia."""
+        now = time.time()
+        with self.pool.connection() as conn, conn:
+            row = conn.execute(CLAIM_QUERY, (self.owner, now + self.lease_seconds, now)).fetchone()
+        if row is None:
+            return None
+        job_id, image_path, attempts, created_at = row
+        job_duration.observe(now - created_at, stage="wait")
+        return {"id": job_id, "image_path": image_path, "attempts": attempts}
+
+    def wait_for_job(self, timeout: float = POLL_INTERVAL):
+        """Espera um enqueue deste processo (ou o timeout, para ver jobs de outros processos)."""
+        with self._wakeup:
+            self._wakeup.wait(timeout)
+
+    def finish(self, conn: sqlite3.Connection, job: dict, result: dict, car_id: int):
+        """Marca o job como concluído, dentro da transação do chamador (a mesma que inseriu o carro).
+
+        Levanta LeaseLost se o job não pertencer mais a este processo; o
+        chamador deve então desfazer a transação.
+        """
+        updated = conn.execute(
+            "UPDATE image_jobs SET status = 'done', result = ?, car_id = ?, error = NULL, finished_at = ?, "
+            "lease_owner = NULL, lease_expires = NULL "
+            "WHERE id = ? AND status = 'running' AND lease_owner = ? AND attempts = ?",
+            (json.dumps(result, ensure_ascii=False), car_id, time.time(), job["id"], self.owner, job["attempts"]),
+        ).rowcount
+        if not updated:
+            raise LeaseLost(f"Job {job['id']} não pertence mais a este worker.")
+
+    def fail(self, job: dict, error: str, retry: bool = False):
+        """Registra a falha do job; com retry, devolve-o à fila se ainda houver tentativas."""
+        retry = retry and job["attempts"] < self.max_attempts
+        with self.pool.connection() as conn, conn:
+            updated = conn.execute(
+                "UPDATE image_jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ? AND status = 'running' AND lease_owner = ? AND attempts = ?",
+                ("queued" if retry else "failed", error, None if retry else time.time(),
+                 job["id"], self.owner, job["attempts"]),
+            ).rowcount
+        job_outcomes.inc(outcome="retried" if retry else "failed")
+        # Sem a posse (updated = 0) o job é de outro worker, que ainda precisa da imagem
+        if updated and not retry:
+            _discard_image(job["image_path"])
+
+    def heartbeat(self):
+        """Renova a posse de todos os jobs em andamento neste processo."""
+        with self.pool.connection() as conn, conn:
+            conn.execute(
+                "UPDATE image_jobs SET lease_expires = ? WHERE status = 'running' AND lease_owner = ?",
+                (time.time() + self.lease_seconds, self.owner),
+            )
+
+    def requeue_expired(self) -> int:
+        """Devolve à fila os jobs de workers que pararam de renovar a posse (processo morto).
+
+        Jobs que já usaram max_attempts tentativas são dados como falhos, e
+        suas imagens, apagadas.
+        """
+        now = time.time()
+        discarded = []
+        with self.pool.connection() as conn, conn:
+            expired = conn.execute(EXPIRED_LEASES_QUERY, (now,)).fetchall()
+            for job_id, attempts, image_path in expired:
+                failed = attempts >= self.max_attempts
+                updated = conn.execute(
+                    "UPDATE image_jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL "
+                    "WHERE id = ? AND status = 'running' AND lease_expires < ?",
+                    ("failed" if failed else "queued", "Worker parou durante o processamento.",
+                     now if failed else None, job_id, now),
+                ).rowcount
+                job_outcomes.inc(outcome="failed" if failed else "expired")
+                if updated and failed:
+                    discarded.append(image_path)
+        # Só depois do commit: se a transação falhar, o job continua com a imagem
+        for image_path in discarded:
+            _discard_image(image_path)
+        return len(expired)
+
+
+class JobWorkers:
+    """Pool de threads que consome a fila chamando handler(job) para cada job.
+
+    O handler deve gravar o resultado com queue.finish na transação que
+    insere o carro. Se ele levantar ValueError, o job falha de vez (imagem
+    ilegível, dados inválidos); outras exceções devolvem o job à fila.
+    Uma thread extra renova a posse dos jobs em andamento e recoloca na
+    fila os jobs abandonados por outros processos.
+    """
+
+    def __init__(self, queue: ImageJobQueue, handler, workers: int = JOB_WORKERS):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.workers <= 0 or self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f"image-job-{i}", daemon=True))
+        self._threads.append(threading.Thread(target=self._maintain, name="image-job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = None):
+        """Para de pegar jobs e espera os que estão em andamento terminarem."""
+        self._stop.set()
+        with self.queue._wakeup:
+            self.queue._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                print(f"Erro ao buscar job na fila: {e}")
+                job = None
+            if job is None:
+                self.queue.wait_for_job()
+                continue
+            self._run(job)
+
+    def _run(self, job: dict):
+        start = time.perf_counter()
+        try:
+            self.handler(job)
+            job_outcomes.inc(outcome="done")
+        except LeaseLost as e:
+            print(f"Aviso: {e}")
+        except ValueError as e:
+            metrics.record_error("image_job", e)
+            self._fail(job, str(e), retry=False)
+        except Exception as e:
+            metrics.record_error("image_job", e)
+            self._fail(job, f"{type(e).__name__}: {e}", retry=True)
+        finally:
+            job_duration.observe(time.perf_counter() - start, stage="run")
+
+    def _fail(self, job: dict, error: str, retry: bool):
+        print(f"Job {job['id']} falhou: {error}")
+        try:
+            self.queue.fail(job, error, retry)
+        except sqlite3.Error as e:
+            # A posse expira e o job volta para a fila pelo requeue_expired
+            print(f"Erro ao registrar a falha do job {job['id']}: {e}")
+
+    def _maintain(self):
+        interval = self.queue.lease_seconds / 3
+        while not self._stop.wait(interval):
+            try:
+                self.queue.heartbeat()
+                self.queue.requeue_expired()
+            except sqlite3.Error as e:
+                print(f"Erro no heartbeat da fila de jobs: {e}")
@@ -1,98 +1,350 @@
-import requests
 import asyncio
+import os
+import threading
+
+import httpx
 
 SERVER_URL = "http://localhost:8000"
 
-def add_car(brand: str, model: str, price: float, rating: float):
-    """Adiciona um carro ao servidor."""
+# Requisições simultâneas permitidas e conexões keep-alive mantidas no pool.
+# Uma consulta a várias marcas (get_cars_by_brands) sai inteira de uma vez se tiver até
+# MAX_CONCURRENCY marcas; acima disso, vai em levas. Quem espera mais passa max_concurrency
+# (e max_connections) ao criar o cliente. O servidor ainda limita o paralelismo real ao seu pool.
+MAX_CONCURRENCY = 64
+MAX_CONNECTIONS = MAX_CONCURRENCY
+# Tamanho de cada lote enviado por add_cars_batch
+BATCH_CHUNK_SIZE = 1000
+TIMEOUT = 30.0
+
+def _car_payload(brand: str, model: str, price: float, rating: float, launch_date: str = None) -> dict:
     data = {
         "brand": brand,
         "model": model,
         "price": price,
         "rating": rating
     }
-    response = requests.post(f"{SERVER_URL}/add_car", json=data)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to add car: {response.text}"}
+    if launch_date is not None:
+        data["launch_date"] = launch_date
+    return data
+
+class AsyncCarClient:
+    """Cliente assíncrono do servidor de carros.
+
+    Usa um único httpx.AsyncClient (conexões keep-alive reaproveitadas) e
+    limita a MAX_CONCURRENCY o número de requisições em andamento.
+    """
+
+    def __init__(self, server_url: str = SERVER_URL, max_connections: int = MAX_CONNECTIONS,
+                 max_concurrency: int = MAX_CONCURRENCY, timeout: float = TIMEOUT):
+        self._http = httpx.AsyncClient(
+            base_url=server_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _request(self, method: str, path: str, error: str, **kwargs):
+        async with self._semaphore:
+            response = await self._http.request(method, path, **kwargs)
+        if response.status_code == 200:
+            return response.json()
+        return {"error": f"{error}: {response.text}"}
+
+    async def gather(self, *coroutines) -> list:
+        """Executa várias operações ao mesmo tempo e retorna os resultados na mesma ordem."""
+        return list(await asyncio.gather(*coroutines))
+
+    async def add_car(self, brand: str, model: str, price: float, rating: float):
+        """Adiciona um carro ao servidor."""
+        return await self._request("POST", "/add_car", "Failed to add car",
+                                   json=_car_payload(brand, model, price, rating))
+
+    async def add_car_with_date(self, brand: str, model: str, price: float, rating: float, launch_date: str):
+        """Adiciona um carro ao servidor com data de lançamento."""
+        return await self._request("POST", "/add_car_with_date", "Failed to add car",
+                                   json=_car_payload(brand, model, price, rating, launch_date))
+
+    async def add_cars_batch(self, cars: list, chunk_size: int = BATCH_CHUNK_SIZE):
+        """Adiciona vários carros ao servidor, enviando os lotes em paralelo.
+
+        Os índices do relatório retornado se referem à lista original.
+        """
+        starts = range(0, len(cars), chunk_size)
+        results = await self.gather(*(
+            self._request("POST", "/add_cars_batch", "Failed to add cars", json=cars[start:start + chunk_size])
+            for start in starts
+        ))
+        report = {"inserted": 0, "accepted": [], "rejected": []}
+        for start, result in zip(starts, results):
+            if "error" in result:
+                size = min(chunk_size, len(cars) - start)
+                report["rejected"].extend({"index": start + i, "error": result["error"]} for i in range(size))
+                continue
+            report["inserted"] += result["inserted"]
+            report["accepted"].extend(start + i for i in result["accepted"])
+            report["rejected"].extend(
+                {"index": start + item["index"], "error": item["error"]}
+                for item in result["rejected"]
+            )
+        return report
+
+    async def get_cars_by_brand(self, brand: str):
+        """Obtém carros de uma marca específica do servidor."""
+        return await self._request("GET", "/get_cars_by_brand", "Failed to get cars", params={"brand": brand})
+
+    async def get_cars_by_brands(self, brands: list) -> dict:
+        """Busca várias marcas ao mesmo tempo; retorna {marca: carros}.
+
+        Até max_concurrency marcas saem todas juntas; acima disso, em levas.
+        """
+        results = await self.gather(*(self.get_cars_by_brand(brand) for brand in brands))
+        return dict(zip(brands, results))
+
+    async def get_cars_by_model(self, model: str):
+        """Obtém carros de um modelo específico do servidor."""
+        return await self._request("GET", "/get_cars_by_model", "Failed to get cars", params={"model": model})
+
+    async def get_all_cars(self):
+        """Obtém todos os carros do servidor."""
+        return await self._request("GET", "/get_all_cars", "Failed to get cars")
+
+    async def get_all_cars_page(self, after_id: int = 0, limit: int = 1000) -> tuple:
+        """Obtém uma página de carros; retorna (carros, cursor da próxima página ou None).
+
+        Em caso de erro, como os demais métodos, retorna ({"error": ...}, None).
+        """
+        async with self._semaphore:
+            response = await self._http.get("/get_all_cars", params={"after_id": after_id, "limit": limit})
+        if response.status_code != 200:
+            return {"error": f"Failed to get cars: {response.text}"}, None
+        next_cursor = response.headers.get("X-Next-Cursor")
+        return response.json(), int(next_cursor) if next_cursor is not None else None
+
+    async def iter_all_cars(self, page_size: int = 1000):
+        """Percorre todos os carros do servidor página por página (paginação por cursor).
+
+        Se uma página falhar, o último item gerado é o dicionário de erro.
+        """
+        after_id = 0
+        while after_id is not None:
+            cars, after_id = await self.get_all_cars_page(after_id, page_size)
+            if isinstance(cars, dict):
+                yield cars
+                return
+            for car in cars:
+                yield car
+
+    async def get_cars_filtered(self, brand: str = None, start_date: str = None, end_date: str = None,
+                                min_rating: float = None, limit: int = 10):
+        """Obtém carros filtrados do servidor."""
+        params = {}
+        if brand:
+            params["brand"] = brand
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+        if min_rating is not None:
+            params["min_rating"] = min_rating
+        params["limit"] = limit
+        return await self._request("GET", "/get_cars_filtered", "Failed to get cars", params=params)
+
+    async def get_brand_stats(self, brand: str = None):
+        """Obtém os agregados por marca (quantidade, preço médio, nota média, histograma de notas)."""
+        params = {"brand": brand} if brand else {}
+        return await self._request("GET", "/brand_stats", "Failed to get brand stats", params=params)
+
+    async def get_top_cars_per_brand(self, k: int = 3, brand: str = None):
+        """Obtém os k carros de maior nota de cada marca."""
+        params = {"k": k}
+        if brand:
+            params["brand"] = brand
+        return await self._request("GET", "/top_cars_per_brand", "Failed to get cars", params=params)
+
+    async def search_cars(self, query: str, limit: int = 10):
+        """Busca aproximada por marca e modelo (tolerante a erros de OCR)."""
+        return await self._request("GET", "/search_cars", "Failed to search cars",
+                                   params={"q": query, "limit": limit})
+
+    async def submit_image(self, image_path: str):
+        """Envia uma imagem para a fila de análise do servidor; retorna {"job_id", "status"} sem esperar o OCR."""
+        with open(image_path, "rb") as f:
+            files = {"image": (os.path.basename(image_path), f.read())}
+        async with self._semaphore:
+            response = await self._http.post("/analyze_image", files=files)
+        if response.status_code == 202:
+            return response.json()
+        return {"error": f"Failed to submit image: {response.text}"}
+
+    async def get_job(self, job_id: int):
+        """Obtém o status de um job de análise de imagem (queued, running, done ou failed)."""
+        return await self._request("GET", f"/jobs/{job_id}", "Failed to get job")
+
+class CarClient:
+    """Versão síncrona do AsyncCarClient, para código que não usa asyncio (como o chatbot).
+
+    Um event loop roda em uma thread de fundo com um único AsyncCarClient;
+    todas as chamadas, de qualquer thread, compartilham o mesmo pool de conexões.
+    """
+
+    def __init__(self, server_url: str = SERVER_URL, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="car-client", daemon=True)
+        self._thread.start()
+        self._async = self._run(self._create(server_url, options))
+
+    @staticmethod
+    async def _create(server_url: str, options: dict) -> AsyncCarClient:
+        # Criado dentro do loop de fundo, ao qual o pool e o semáforo ficam presos
+        return AsyncCarClient(server_url, **options)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        self._run(self._async.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def add_car(self, brand: str, model: str, price: float, rating: float):
+        return self._run(self._async.add_car(brand, model, price, rating))
+
+    def add_car_with_date(self, brand: str, model: str, price: float, rating: float, launch_date: str):
+        return self._run(self._async.add_car_with_date(brand, model, price, rating, launch_date))
+
+    def add_cars_batch(self, cars: list, chunk_size: int = BATCH_CHUNK_SIZE):
+        return self._run(self._async.add_cars_batch(cars, chunk_size))
+
+    def get_cars_by_brand(self, brand: str):
+        return self._run(self._async.get_cars_by_brand(brand))
+
+    def get_cars_by_brands(self, brands: list) -> dict:
+        return self._run(self._async.get_cars_by_brands(brands))
+
+    def get_cars_by_model(self, model: str):
+        return self._run(self._async.get_cars_by_model(model))
+
+    def get_all_cars(self):
+        return self._run(self._async.get_all_cars())
+
+    def iter_all_cars(self, page_size: int = 1000):
+        after_id = 0
+        while after_id is not None:
+            cars, after_id = self._run(self._async.get_all_cars_page(after_id, page_size))
+            if isinstance(cars, dict):
+                yield cars
+                return
+            yield from cars
+
+    def get_cars_filtered(self, brand: str = None, start_date: str = None, end_date: str = None,
+                          min_rating: float = None, limit: int = 10):
+        return self._run(self._async.get_cars_filtered(brand, start_date, end_date, min_rating, limit))
+
+    def get_brand_stats(self, brand: str = None):
+        return self._run(self._async.get_brand_stats(brand))
+
+    def get_top_cars_per_brand(self, k: int = 3, brand: str = None):
+        return self._run(self._async.get_top_cars_per_brand(k, brand))
+
+    def search_cars(self, query: str, limit: int = 10):
+        return self._run(self._async.search_cars(query, limit))
+
+    def submit_image(self, image_path: str):
+        return self._run(self._async.submit_image(image_path))
+
+    def get_job(self, job_id: int):
+        return self._run(self._async.get_job(job_id))
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def default_client() -> CarClient:
+    """Cliente síncrono compartilhado pelas funções deste módulo."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = CarClient(SERVER_URL)
+    return _default_client
+
+# Funções de conveniência (mesma interface de antes), todas no mesmo pool de conexões
+def add_car(brand: str, model: str, price: float, rating: float):
+    """Adiciona um carro ao servidor."""
+    return default_client().add_car(brand, model, price, rating)
+
+def add_cars_batch(cars: list, chunk_size: int = BATCH_CHUNK_SIZE):
+    """Adiciona vários carros ao servidor, enviando a lista em lotes."""
+    return default_client().add_cars_batch(cars, chunk_size)
 
 def get_cars_by_brand(brand: str):
     """Obtém carros de uma marca específica do servidor."""
-    response = requests.get(f"{SERVER_URL}/get_cars_by_brand", params={"brand": brand})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to get cars: {response.text}"}
+    return default_client().get_cars_by_brand(brand)
 
 def get_cars_by_model(model: str):
     """Obtém carros de um modelo específico do servidor."""
-    response = requests.get(f"{SERVER_URL}/get_cars_by_model", params={"model": model})
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to get cars: {response.text}"}
+    return default_client().get_cars_by_model(model)
 
 def get_all_cars():
     """Obtém todos os carros do servidor."""
-    response = requests.get(f"{SERVER_URL}/get_all_cars")
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to get cars: {response.text}"}
+    return default_client().get_all_cars()
+
+def iter_all_cars(page_size: int = 1000):
+    """Percorre todos os carros do servidor página por página (paginação por cursor)."""
+    return default_client().iter_all_cars(page_size)
 
 def add_car_with_date(brand: str, model: str, price: float, rating: float, launch_date: str):
     """Adiciona um carro ao servidor com data de lançamento."""
-    data = {
-        "brand": brand,
-        "model": model,
-        "price": price,
-        "rating": rating,
-        "launch_date": launch_date
-    }
-    response = requests.post(f"{SERVER_URL}/add_car_with_date", json=data)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to add car: {response.text}"}
+    return default_client().add_car_with_date(brand, model, price, rating, launch_date)
 
 def get_cars_filtered(brand: str = None, start_date: str = None, end_date: str = None, min_rating: float = None, limit: int = 10):
     """Obtém carros filtrados do servidor."""
-    params = {}
-    if brand:
-        params["brand"] = brand
-    if start_date:
-        params["start_date"] = start_date
-    if end_date:
-        params["end_date"] = end_date
-    if min_rating is not None:
-        params["min_rating"] = min_rating
-    params["limit"] = limit
-    response = requests.get(f"{SERVER_URL}/get_cars_filtered", params=params)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Failed to get cars: {response.text}"}
+    return default_client().get_cars_filtered(brand, start_date, end_date, min_rating, limit)
+
+def get_brand_stats(brand: str = None):
+    """Obtém os agregados por marca (quantidade, preço médio, nota média, histograma de notas)."""
+    return default_client().get_brand_stats(brand)
+
+def get_top_cars_per_brand(k: int = 3, brand: str = None):
+    """Obtém os k carros de maior nota de cada marca."""
+    return default_client().get_top_cars_per_brand(k, brand)
+
+def search_cars(query: str, limit: int = 10):
+    """Busca aproximada por marca e modelo (tolerante a erros de OCR)."""
+    return default_client().search_cars(query, limit)
 
 async def main():
     # Exemplo de uso do cliente
     print("Conectando ao servidor...")
-    
-    # Adicionar um carro
-    result = add_car("Toyota", "Corolla", 80000.0, 4.5)
-    print(f"Carro adicionado: {result}")
-    
-    # Buscar carros por marca
-    cars = get_cars_by_brand("Toyota")
-    print(f"Carros da marca Toyota: {cars}")
-    
-    # Buscar carros por modelo
-    cars = get_cars_by_model("Corolla")
-    print(f"Carros do modelo Corolla: {cars}")
-    
-    # Listar todos os carros
-    cars = get_all_cars()
-    print(f"Todos os carros: {cars}")
+
+    async with AsyncCarClient() as client:
+        # Adicionar um carro
+        result = await client.add_car("Toyota", "Corolla", 80000.0, 4.5)
+        print(f"Carro adicionado: {result}")
+
+        # Buscar carros por marca e por modelo ao mesmo tempo
+        by_brand, by_model = await client.gather(
+            client.get_cars_by_brand("Toyota"),
+            client.get_cars_by_model("Corolla")
+        )
+        print(f"Carros da marca Toyota: {by_brand}")
+        print(f"Carros do modelo Corolla: {by_model}")
+
+        # Várias marcas em paralelo
+        cars = await client.get_cars_by_brands(["Toyota", "Honda", "Nissan"])
+        print(f"Carros por marca: {cars}")
+
+        # Listar todos os carros
+        cars = await client.get_all_cars()
+        print(f"Todos os carros: {cars}")
 
 if __name__ == "__main__":
     asyncio.run(main())
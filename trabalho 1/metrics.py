@@ -0,0 +1,206 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Configuração (variáveis de ambiente)
+METRICS_ENABLED = os.environ.get("CARS_METRICS_ENABLED", "1") != "0"
+# Consultas SQL mais lentas que isto (ms) são registradas no log 'cars.slow_query' (0 desliga)
+SLOW_QUERY_MS = float(os.environ.get("CARS_SLOW_QUERY_MS", "200"))
+
+# Limites dos histogramas de latência, em segundos (1 ms a 60 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+slow_query_log = logging.getLogger("cars.slow_query")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Contador monotônico, com um valor por combinação de rótulos."""
+
+    def __init__(self, name: str, help_text: str, enabled: bool = True):
+        self.name = name
+        self.help = help_text
+        self.enabled = enabled
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(labels)} {value}" for labels, value in values)
+        return lines
+
+
+class Histogram:
+    """Histograma de valores (em segundos) com limites fixos, no formato do Prometheus."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS, enabled: bool = True):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self._series = {}  # rótulos -> [contagem por faixa..., soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mede a duração do bloco with."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {values[-1]}")
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas do processo, exportado no formato texto do Prometheus."""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, enabled=self.enabled, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Métrica {name} já registrada com outro tipo.")
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registro compartilhado por server, image_processing, carregararctic e text2sql_service
+registry = Registry()
+
+# Tipo de conteúdo da rota /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_request_duration = registry.histogram(
+    "cars_http_request_duration_seconds", "Duração das requisições HTTP por rota, método e status.")
+sql_query_duration = registry.histogram(
+    "cars_sql_query_duration_seconds", "Duração das consultas SQL por consulta nomeada.")
+slow_queries = registry.counter(
+    "cars_sql_slow_queries_total", "Consultas SQL acima de CARS_SLOW_QUERY_MS.")
+errors = registry.counter(
+    "cars_errors_total", "Erros tratados, por componente e tipo.")
+ocr_stage_duration = registry.histogram(
+    "cars_ocr_stage_duration_seconds", "Duração de cada etapa da análise de imagem.")
+ocr_images = registry.counter(
+    "cars_ocr_images_total", "Imagens analisadas, separando as que vieram do cache de OCR.")
+text2sql_stage_duration = registry.histogram(
+    "cars_text2sql_stage_duration_seconds", "Duração de cada etapa do Text2SQL (tokenize, generate, decode).")
+
+
+@contextmanager
+def sql_timer(query_name: str, sql: str, params=()):
+    """Mede uma consulta SQL e registra no log as que passarem de SLOW_QUERY_MS."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        sql_query_duration.observe(elapsed, query=query_name)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_queries.inc(query=query_name)
+            slow_query_log.warning("Consulta lenta (%.1f ms) %s: %s %r", elapsed * 1000, query_name, " ".join(sql.split()), params)
+
+
+def instrument_flask(app):
+    """Mede a latência de cada rota do app Flask e expõe o registro em GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_duration(response):
+        start = g.get("request_start")
+        if start is not None:
+            # Rota como declarada (ex: /get_cars_by_brand), não a URL com parâmetros
+            route = request.url_rule.rule if request.url_rule else "<não encontrada>"
+            http_request_duration.observe(
+                time.perf_counter() - start, route=route, method=request.method, status=response.status_code
+            )
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_http():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    return app
+
+
+def record_error(component: str, error: BaseException):
+    """Conta um erro tratado (o chamador continua responsável por reportá-lo)."""
+    errors.inc(component=component, type=type(error).__name__)
+
+
+def record_stage_timings(histogram: Histogram, timings: dict):
+    """Registra um dicionário etapa -> milissegundos, como o de analyze_image_detailed."""
+    for stage, elapsed_ms in timings.items():
+        histogram.observe(elapsed_ms / 1000, stage=stage)
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+import time
+
+from database import connect
+
+# Configuração (variáveis de ambiente)
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "1") != "0"
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", "ocr_cache.db")
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Resolução (s) do last_used: um acerto só grava no disco se o valor guardado for mais antigo que isso
+LAST_USED_RESOLUTION = 300
+
+
+def image_digest(data: bytes) -> str:
+    """SHA-256 do conteúdo da imagem, usado como chave do cache."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class OcrCache:
+    """Cache em disco (SQLite) dos resultados de OCR, endereçado pelo conteúdo da imagem.
+
+    A chave é o SHA-256 dos bytes da imagem mais a versão do pipeline de
+    pré-processamento/OCR. Processos com versões diferentes podem dividir o
+    mesmo arquivo: entradas de versões que ninguém mais usa não são lidas e
+    saem pela remoção por tamanho. Quando o tamanho total passa de
+    max_bytes, as entradas usadas há mais tempo (de qualquer versão) são removidas; o último uso é registrado com
+    resolução de LAST_USED_RESOLUTION segundos, para que acertos seguidos
+    na mesma imagem não virem uma escrita (e um commit) cada.
+    """
+
+    def __init__(self, path: str = OCR_CACHE_PATH, pipeline_version: str = "1", max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.pipeline_version = pipeline_version
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_results (
+                    digest TEXT NOT NULL,
+                    pipeline_version TEXT NOT NULL,
+                    text TEXT,
+                    brand TEXT,
+                    model TEXT,
+                    price REAL,
+                    rating REAL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (digest, pipeline_version)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_results_last_used ON ocr_results (last_used)")
+        self._total_bytes = self._stored_bytes()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+
+    def get(self, digest: str):
+        """Retorna (texto, (marca, modelo, preço, nota)) ou None se não estiver em cache."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, brand, model, price, rating, last_used FROM ocr_results "
+                "WHERE digest = ? AND pipeline_version = ?",
+                (digest, self.pipeline_version)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[5] > LAST_USED_RESOLUTION:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE ocr_results SET last_used = ? WHERE digest = ? AND pipeline_version = ?",
+                        (now, digest, self.pipeline_version)
+                    )
+        return row[0], tuple(row[1:5])
+
+    def put(self, digest: str, text: str, result: tuple):
+        """Guarda o texto do OCR e a tupla (marca, modelo, preço, nota) já extraída."""
+        brand, model, price, rating = result
+        size = len(text.encode("utf-8")) + len(brand.encode("utf-8")) + len(model.encode("utf-8")) + 64
+        with self._lock, self._conn:
+            # A mesma imagem pode ter sido gravada por outra thread/processo: desconta a entrada substituída
+            replaced = self._conn.execute(
+                "SELECT size FROM ocr_results WHERE digest = ? AND pipeline_version = ?",
+                (digest, self.pipeline_version)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results "
+                "(digest, pipeline_version, text, brand, model, price, rating, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, self.pipeline_version, text, brand, model, price, rating, size, time.time())
+            )
+            self._total_bytes += size - (replaced[0] if replaced else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Outros processos também gravam no cache: recalcula o total real antes
+        self._total_bytes = self._stored_bytes()
+        target = self.max_bytes * 0.9  # folga para não despejar a cada inserção
+        cursor = self._conn.execute("SELECT digest, pipeline_version, size FROM ocr_results ORDER BY last_used")
+        victims = []
+        for digest, version, size in cursor:
+            if self._total_bytes <= target:
+                break
+            victims.append((digest, version))
+            self._total_bytes -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM ocr_results WHERE digest = ? AND pipeline_version = ?", victims)
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,138 @@
+import functools
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Configuração (variáveis de ambiente)
+CACHE_ENABLED = os.environ.get("CARS_CACHE_ENABLED", "1") != "0"
+CACHE_MAX_ENTRIES = int(os.environ.get("CARS_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL = float(os.environ.get("CARS_CACHE_TTL", "300"))  # segundos
+
+
+def _copy(value):
+    """Copia listas e dicionários aninhados (os resultados das ferramentas), mais rápido que deepcopy."""
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    return value
+
+
+class QueryCache:
+    """Cache LRU com TTL para resultados de consultas de leitura.
+
+    Toda escrita no banco incrementa a geração dos dados (bump_generation);
+    entradas gravadas em uma geração anterior deixam de valer. Com
+    watch_database, escritas de outros processos (cars_cli.py, scripts)
+    também invalidam o cache, pelo PRAGMA data_version.
+
+    Os resultados são guardados e devolvidos como cópias: quem alterar a
+    lista ou os dicionários recebidos não altera a entrada do cache.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL, enabled: bool = CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # chave -> (geração, expira_em, valor)
+        self._lock = threading.Lock()
+        # Conexão só de leitura usada para perceber escritas de outras conexões
+        self._watch_conn = None
+        self._data_version = None
+
+    def watch_database(self, db_path: str):
+        """Passa a invalidar o cache quando qualquer outra conexão confirmar uma escrita no banco."""
+        conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+            self._watch_conn = conn
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_data_version(self):
+        # Chamado com self._lock; data_version muda a cada commit de outra conexão (cerca de 5 µs)
+        version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self.generation += 1
+            self._entries.clear()
+
+    def get(self, key):
+        """Retorna (True, valor) se houver entrada válida, senão (False, None)."""
+        with self._lock:
+            if self._watch_conn is not None:
+                self._check_data_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, value = entry
+                if generation == self.generation and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, generation: int):
+        """Guarda o valor calculado na geração informada (ignorado se já estiver velha)."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump_generation(self):
+        """Invalida todo o cache; deve ser chamado depois de cada escrita confirmada."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def cached(self, func):
+        """Decorador read-through: a chave é o nome da função mais os argumentos normalizados."""
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__name__, tuple(sorted(bound.arguments.items())))
+            found, value = self.get(key)
+            if found:
+                return _copy(value)
+            # A geração é lida antes da consulta: se uma escrita ocorrer no meio,
+            # o resultado não é guardado
+            generation = self.generation
+            value = func(*args, **kwargs)
+            self.put(key, _copy(value), generation)
+            return value
+
+        return wrapper
+
+
+# Cache compartilhado pelas ferramentas de leitura do servidor
+query_cache = QueryCache()
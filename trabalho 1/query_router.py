@@ -0,0 +1,107 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Limites superiores (ms) dos baldes do histograma de latência
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 30000, float("inf"))
+
+TIERS = ("parser", "sql_cache", "model")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normaliza o texto da consulta: minúsculas, sem acentos, espaços simples e sem pontuação final."""
+    text = unicodedata.normalize("NFKD", prompt.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?.!; ")
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.total_ms += ms
+
+    def as_dict(self) -> dict:
+        labels = [f"<={b:g}ms" if b != float("inf") else ">30000ms" for b in self.buckets]
+        return {"buckets": dict(zip(labels, self.counts)), "total_ms": self.total_ms}
+
+
+class QueryRouter:
+    """Encaminha consultas em linguagem natural pelo caminho mais barato possível.
+
+    1. parser: o parser determinístico reconhece a consulta e ela vira uma
+       chamada a get_cars_filtered;
+    2. sql_cache: o SQL já gerado antes para a mesma consulta normalizada;
+    3. model: o modelo Text2SQL, cujo SQL é guardado no cache.
+
+    parse_fn(prompt) retorna os filtros de get_cars_filtered ou None quando
+    não reconhece a consulta; filtered_fn(**filtros) retorna os carros;
+    sql_fn(prompt) gera o SQL.
+    """
+
+    def __init__(self, parse_fn, filtered_fn, sql_fn, cache_size: int = 512):
+        self.parse_fn = parse_fn
+        self.filtered_fn = filtered_fn
+        self.sql_fn = sql_fn
+        self.cache_size = cache_size
+        self._sql_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {tier: 0 for tier in TIERS}
+        self.latency = {tier: LatencyHistogram() for tier in TIERS}
+
+    def _record(self, tier: str, start: float):
+        ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.hits[tier] += 1
+            self.latency[tier].observe(ms)
+
+    def route(self, prompt: str) -> dict:
+        """Resolve a consulta e retorna {"tier", "sql", "cars"}.
+
+        No nível parser, "cars" traz o resultado e "sql" é None; nos outros
+        níveis, "sql" traz a consulta a ser executada e "cars" é None.
+        """
+        start = time.perf_counter()
+        filters = self.parse_fn(prompt)
+        if filters is not None:
+            cars = self.filtered_fn(**filters)
+            self._record("parser", start)
+            return {"tier": "parser", "sql": None, "cars": cars}
+
+        key = normalize_prompt(prompt)
+        with self._lock:
+            sql = self._sql_cache.get(key)
+            if sql is not None:
+                self._sql_cache.move_to_end(key)
+        if sql is not None:
+            self._record("sql_cache", start)
+            return {"tier": "sql_cache", "sql": sql, "cars": None}
+
+        sql = self.sql_fn(prompt)
+        with self._lock:
+            self._sql_cache[key] = sql
+            while len(self._sql_cache) > self.cache_size:
+                self._sql_cache.popitem(last=False)
+        self._record("model", start)
+        return {"tier": "model", "sql": sql, "cars": None}
+
+    def forget(self, prompt: str):
+        """Remove do cache o SQL de uma consulta (por exemplo, se ele falhou ao executar)."""
+        with self._lock:
+            self._sql_cache.pop(normalize_prompt(prompt), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "cached_queries": len(self._sql_cache),
+                "latency": {tier: self.latency[tier].as_dict() for tier in TIERS},
+            }
@@ -0,0 +1,113 @@
+"""Entrada de produção do servidor: rotas HTTP no gunicorn e ferramentas MCP via Streamable HTTP.
+
+O gunicorn sobe CARS_SERVER_WORKERS processos, e cada um atende as rotas do
+Flask com CARS_SERVER_THREADS threads (worker gthread, WSGI direto, sem ponte
+para ASGI). Em cada processo, uma thread com o seu próprio event loop serve
+as ferramentas MCP em CARS_MCP_PORT (caminho /mcp). Essa porta é aberta com
+SO_REUSEPORT, e o kernel divide as conexões entre os processos.
+
+No SIGTERM ou SIGINT, o gunicorn para de aceitar conexões e espera as
+requisições em andamento por até CARS_SERVER_GRACEFUL_TIMEOUT segundos. Depois,
+em cada processo, para o servidor MCP, os workers da fila de imagens e as
+threads das ferramentas, e fecha o pool de conexões.
+
+Uso:
+    CARS_SERVER_WORKERS=4 python serve.py
+"""
+import asyncio
+import os
+import socket
+import threading
+
+import uvicorn
+from gunicorn.app.base import BaseApplication
+
+import server
+from database import pool
+
+# Configuração (variáveis de ambiente)
+HOST = os.environ.get("CARS_SERVER_HOST", "0.0.0.0")
+PORT = int(os.environ.get("CARS_SERVER_PORT", "8000"))
+MCP_PORT = int(os.environ.get("CARS_MCP_PORT", "8001"))
+# Processos do gunicorn; cada um tem seu próprio pool de conexões, de threads e cache de consultas
+WORKERS = int(os.environ.get("CARS_SERVER_WORKERS", "1"))
+# Tempo (s) para terminar as requisições em andamento ao encerrar
+GRACEFUL_TIMEOUT = int(os.environ.get("CARS_SERVER_GRACEFUL_TIMEOUT", "30"))
+
+# Sessões MCP sem estado: com vários processos, qualquer um atende qualquer requisição
+server.mcp.settings.stateless_http = True
+
+
+class McpServer:
+    """Servidor uvicorn das ferramentas MCP, rodando em uma thread do processo."""
+
+    def __init__(self, host: str, port: int):
+        config = uvicorn.Config(server.mcp.streamable_http_app(), host=host, port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Todos os processos do gunicorn escutam na mesma porta
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.socket.bind((host, port))
+        self.thread = threading.Thread(target=self._run, name="mcp-http", daemon=True)
+
+    def _run(self):
+        # Fora da thread principal o uvicorn não instala handlers de sinal: quem encerra é stop()
+        asyncio.run(self.server.serve(sockets=[self.socket]))
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout: int):
+        """Pede ao uvicorn para encerrar (ele espera as requisições em andamento) e aguarda a thread."""
+        self.server.should_exit = True
+        self.thread.join(timeout)
+        self.socket.close()
+
+
+mcp_server = None
+
+
+def post_worker_init(worker):
+    """Roda em cada processo do gunicorn, depois do fork: banco, fila de imagens e servidor MCP."""
+    global mcp_server
+    server.init_db()
+    server.start_job_workers()
+    mcp_server = McpServer(HOST, MCP_PORT)
+    mcp_server.start()
+
+
+def worker_exit(arbiter, worker):
+    """Roda no processo que está saindo, depois que as requisições HTTP em andamento terminaram."""
+    if mcp_server is not None:
+        mcp_server.stop(GRACEFUL_TIMEOUT)
+    server.stop_job_workers()
+    server.tool_executor.shutdown(wait=True)
+    pool.close()
+
+
+class ProductionServer(BaseApplication):
+    """Gunicorn configurado pelas variáveis de ambiente, sem arquivo de configuração."""
+
+    def load_config(self):
+        settings = {
+            "bind": f"[{HOST}]:{PORT}" if ":" in HOST else f"{HOST}:{PORT}",
+            "workers": WORKERS,
+            "worker_class": "gthread",
+            "threads": server.SERVER_THREADS,
+            "graceful_timeout": GRACEFUL_TIMEOUT,
+            "post_worker_init": post_worker_init,
+            "worker_exit": worker_exit,
+        }
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return server.app
+
+
+if __name__ == "__main__":
+    print(f"Servidor iniciado em {HOST}:{PORT}, MCP em {HOST}:{MCP_PORT}/mcp "
+          f"({WORKERS} processo(s), {server.SERVER_THREADS} threads cada)...")
+    ProductionServer().run()
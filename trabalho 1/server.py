@@ -1,108 +1,326 @@
+import asyncio
+import functools
+import itertools
+import json
+import os
+import re
 import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from mcp.server.fastmcp import FastMCP
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from database import POOL_SIZE, RATING_BUCKET_COLUMNS, PoolTimeout, pool, migrate, check_query_plans, validate_car
+from query_cache import query_cache
+from columnar import COLUMNAR_ENABLED, CONSISTENCY_QUERY, NEW_CARS_QUERY, ColumnarSnapshot, routes_to_columnar
+from job_queue import CLAIM_QUERY, EXPIRED_LEASES_QUERY, JOB_COLUMNS, PENDING_COUNT_QUERY, ImageJobQueue, JobWorkers, QueueFull
+import metrics
+from metrics import sql_timer
 
 # Inicializa o servidor MCP
 mcp = FastMCP("car-analysis-server")
 
-# Cria a tabela de carros se não existir
+# Threads para o trabalho bloqueante (SQLite) das ferramentas MCP, fora do event loop do FastMCP,
+# e threads do gunicorn por processo no serve.py; o padrão acompanha o tamanho do pool de conexões
+SERVER_THREADS = int(os.environ.get("CARS_SERVER_THREADS", str(POOL_SIZE)))
+tool_executor = ThreadPoolExecutor(max_workers=SERVER_THREADS, thread_name_prefix="mcp-tool")
+
+def tool(func):
+    """Registra func como ferramenta MCP executada em tool_executor, fora do event loop.
+
+    Retorna func sem alterações, para que as rotas HTTP a chamem diretamente.
+    """
+    @functools.wraps(func)
+    async def run_in_thread(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(tool_executor, functools.partial(func, *args, **kwargs))
+
+    mcp.add_tool(run_in_thread)
+    return func
+
+# Número máximo de carros aceitos em uma única chamada de add_cars_batch
+MAX_BATCH_SIZE = 10000
+
+# Linhas por página no modo streaming (cada página é lida em uma transação curta)
+STREAM_FETCH_SIZE = 500
+
+CAR_COLUMNS = "brand, model, price, rating, launch_date"
+
+INSERT_CAR = "INSERT INTO cars (brand, model, price, rating, launch_date) VALUES (?, ?, ?, ?, ?)"
+
+# Paginação por keyset: o cursor é o último id já entregue
+ALL_CARS_QUERY = f"SELECT id, {CAR_COLUMNS} FROM cars WHERE id > ? ORDER BY id LIMIT ?"
+
+# Agregados por marca, lidos do resumo brand_stats (uma linha por marca)
+BRAND_STATS_QUERY = (
+    "SELECT brand, car_count, price_count, price_sum, rating_count, rating_sum, "
+    f"{', '.join(RATING_BUCKET_COLUMNS)} FROM brand_stats"
+)
+
+# Melhores carros de uma marca: busca no índice (brand, rating), sem ordenar a marca toda
+TOP_CARS_QUERY = f"SELECT {CAR_COLUMNS} FROM cars WHERE brand = ? ORDER BY rating DESC LIMIT ?"
+
+# Maior k aceito por get_top_cars_per_brand
+MAX_TOP_K = 100
+
+# Busca aproximada: nomes (marca, modelo) mais parecidos pelo índice de trigramas (bm25: menor é melhor)
+SEARCH_NAMES_QUERY = (
+    "SELECT n.brand, n.model, bm25(car_names_fts) AS score "
+    "FROM car_names_fts JOIN car_names n ON n.id = car_names_fts.rowid "
+    "WHERE car_names_fts MATCH ? ORDER BY score LIMIT ?"
+)
+
+# Carros de um nome encontrado, melhores notas primeiro
+SEARCH_CARS_QUERY = f"SELECT {CAR_COLUMNS} FROM cars WHERE model = ? AND brand = ? ORDER BY rating DESC LIMIT ?"
+
+# Maior limit aceito por search_cars
+MAX_SEARCH_LIMIT = 100
+
+# Snapshot colunar em memória para get_cars_filtered (opcional, CARS_COLUMNAR_ENABLED=1)
+columnar_snapshot = ColumnarSnapshot() if COLUMNAR_ENABLED else None
+
+# Pasta onde POST /analyze_image grava as imagens até o job terminar
+UPLOAD_DIR = os.environ.get("CARS_UPLOAD_DIR", "uploads")
+# Tamanho máximo (bytes) de uma imagem enviada
+MAX_UPLOAD_BYTES = int(os.environ.get("CARS_MAX_UPLOAD_BYTES", str(10 * 2**20)))
+# Sugestão (s) de espera enviada no Retry-After quando a fila está cheia
+QUEUE_RETRY_AFTER = 5
+
+# Fila durável de análise de imagens (tabela image_jobs) e seus workers
+image_jobs = ImageJobQueue(pool)
+
+# Cria/atualiza o esquema do banco e confere os planos de consulta
 def init_db():
-    conn = sqlite3.connect("cars.db")
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS cars (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            brand TEXT,
-            model TEXT,
-            price REAL,
-            rating REAL,
-            launch_date TEXT
+    with pool.connection() as conn:
+        migrate(conn)
+        check_query_plans(conn, planned_queries())
+    if query_cache.enabled:
+        # Escritas de outros processos (outro worker, cars_cli.py) também invalidam o cache
+        query_cache.watch_database(pool.db_path)
+    if columnar_snapshot is not None:
+        # Carrega em segundo plano; enquanto isso get_cars_filtered usa só o SQLite
+        columnar_snapshot.load_in_background(pool)
+
+def planned_queries() -> dict:
+    """Consultas usadas pelas ferramentas, com parâmetros de exemplo, para EXPLAIN QUERY PLAN."""
+    queries = {
+        "get_all_cars": (ALL_CARS_QUERY, (0, -1)),
+        "get_cars_by_brand": (f"SELECT {CAR_COLUMNS} FROM cars WHERE brand = ?", ("",)),
+        "get_cars_by_model": (f"SELECT {CAR_COLUMNS} FROM cars WHERE model = ?", ("",)),
+        "get_brand_stats": (BRAND_STATS_QUERY + " ORDER BY brand", ()),
+        "get_brand_stats(brand)": (BRAND_STATS_QUERY + " WHERE brand = ?", ("",)),
+        "get_top_cars_per_brand": (TOP_CARS_QUERY, ("", 1)),
+        "search_cars(nomes)": (SEARCH_NAMES_QUERY, ('"abc"', 10)),
+        "search_cars(carros)": (SEARCH_CARS_QUERY, ("", "", 10)),
+        "get_cars_filtered(colunar, novos)": (NEW_CARS_QUERY, (0,)),
+        "get_cars_filtered(colunar, conferência)": (CONSISTENCY_QUERY, ()),
+        "image_jobs(pendentes)": (PENDING_COUNT_QUERY, ()),
+        "image_jobs(próximo)": (CLAIM_QUERY, ("", 0, 0)),
+        "image_jobs(posses vencidas)": (EXPIRED_LEASES_QUERY, (0,)),
+        "image_jobs(status)": (f"SELECT {JOB_COLUMNS} FROM image_jobs WHERE id = ?", (0,)),
+    }
+    # Todas as combinações de filtros de get_cars_filtered
+    for use_brand, use_start, use_end, use_rating in itertools.product((False, True), repeat=4):
+        query, params = _filtered_query(
+            "x" if use_brand else None,
+            "2000-01-01" if use_start else None,
+            "2000-12-31" if use_end else None,
+            0.0 if use_rating else None,
+            10
         )
-    """)
-    # Add launch_date column if it doesn't exist (for existing databases)
-    try:
-        conn.execute("ALTER TABLE cars ADD COLUMN launch_date TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    conn.commit()
-    conn.close()
+        name = f"get_cars_filtered(brand={use_brand}, start_date={use_start}, end_date={use_end}, min_rating={use_rating})"
+        queries[name] = (query, params)
+    return queries
+
+def _fetch_all(conn: sqlite3.Connection, query_name: str, query: str, params=()) -> list:
+    """Executa a consulta e lê todas as linhas, medindo o tempo (métricas e log de consultas lentas)."""
+    with sql_timer(query_name, query, params):
+        return conn.execute(query, params).fetchall()
+
+def _execute(conn: sqlite3.Connection, query_name: str, query: str, params=()) -> sqlite3.Cursor:
+    """Executa uma escrita medindo o tempo (métricas e log de consultas lentas); retorna o cursor."""
+    with sql_timer(query_name, query, params):
+        return conn.execute(query, params)
+
+def _car_dicts(rows) -> list:
+    """Converte linhas (brand, model, price, rating, launch_date) em dicionários."""
+    return [{"brand": row[0], "model": row[1], "price": row[2], "rating": row[3], "launch_date": row[4]} for row in rows]
+
+def _car_dict_with_id(row) -> dict:
+    """Converte uma linha (id, brand, model, price, rating, launch_date) em dicionário."""
+    return {"id": row[0], "brand": row[1], "model": row[2], "price": row[3], "rating": row[4], "launch_date": row[5]}
+
+def _brand_stats_dict(row) -> dict:
+    """Converte uma linha de BRAND_STATS_QUERY nos agregados da marca."""
+    brand, car_count, price_count, price_sum, rating_count, rating_sum = row[:6]
+    return {
+        "brand": brand,
+        "count": car_count,
+        "avg_price": price_sum / price_count if price_count else None,
+        "avg_rating": rating_sum / rating_count if rating_count else None,
+        "rating_histogram": {f"{i}-{i + 1}": count for i, count in enumerate(row[6:])},
+    }
 
 # Ferramenta para adicionar dados de um carro ao banco de dados
-@mcp.tool()
+@tool
 def add_car(brand: str, model: str, price: float, rating: float) -> bool:
     """Adiciona um carro ao banco de dados."""
     try:
         # Validação de entrada
-        if not brand or not model:
-            raise ValueError("Marca e modelo são obrigatórios.")
-        if price <= 0:
-            raise ValueError("Preço deve ser positivo.")
-        if not (0 <= rating <= 5):
-            raise ValueError("Nota deve estar entre 0 e 5.")
-
-        conn = sqlite3.connect("cars.db")
-        conn.execute(
-            "INSERT INTO cars (brand, model, price, rating) VALUES (?, ?, ?, ?)",
-            (brand, model, price, rating)
-        )
-        conn.commit()
+        validate_car(brand, model, price, rating)
+
+        with pool.connection() as conn, conn:
+            _execute(conn, "add_car", INSERT_CAR, (brand, model, price, rating, None))
+        query_cache.bump_generation()
         return True
     except sqlite3.Error as e:
+        metrics.record_error("add_car", e)
         print(f"Erro no banco de dados: {e}")
         return False
     except ValueError as e:
+        metrics.record_error("add_car", e)
         print(f"Erro de validação: {e}")
         return False
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
-@mcp.tool()
+def process_image_job(job: dict):
+    """Analisa a imagem de um job da fila e insere o carro, na mesma transação que conclui o job."""
+    # Importado aqui: OpenCV e Tesseract só são necessários nos processos que rodam workers
+    from image_processing import analyze_image_strict
+
+    image_path = job["image_path"]
+    if not os.path.exists(image_path):
+        raise ValueError("Imagem do job não encontrada.")
+    brand, model, price, rating = analyze_image_strict(image_path)
+    validate_car(brand, model, price, rating)
+    with pool.connection() as conn, conn:
+        car_id = _execute(conn, "analyze_image", INSERT_CAR, (brand, model, price, rating, None)).lastrowid
+        # Se a posse do job expirou, LeaseLost desfaz a inserção do carro
+        image_jobs.finish(conn, job, {"brand": brand, "model": model, "price": price, "rating": rating}, car_id)
+    query_cache.bump_generation()
+    os.remove(image_path)
+
+job_workers = JobWorkers(image_jobs, process_image_job)
+
+def start_job_workers():
+    """Inicia os workers da fila de imagens (CARS_JOB_WORKERS threads; 0 só enfileira)."""
+    job_workers.start()
+
+def stop_job_workers():
+    """Para os workers da fila de imagens, esperando os jobs em andamento terminarem."""
+    job_workers.stop()
+
+def save_upload(data: bytes, filename: str = "") -> str:
+    """Grava uma imagem enviada em UPLOAD_DIR com nome único e retorna o caminho."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,5}", extension):
+        extension = ".img"
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(UPLOAD_DIR, uuid.uuid4().hex + extension))
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+@tool
 def add_car_with_date(brand: str, model: str, price: float, rating: float, launch_date: str) -> bool:
     """Adiciona um carro ao banco de dados com data de lançamento."""
-    conn = sqlite3.connect("cars.db")
-    conn.execute(
-        "INSERT INTO cars (brand, model, price, rating, launch_date) VALUES (?, ?, ?, ?, ?)",
-        (brand, model, price, rating, launch_date)
-    )
-    conn.commit()
-    conn.close()
+    with pool.connection() as conn, conn:
+        _execute(conn, "add_car_with_date", INSERT_CAR, (brand, model, price, rating, launch_date))
+    query_cache.bump_generation()
     return True
 
+# Ferramenta para adicionar vários carros em uma única transação
+@tool
+def add_cars_batch(cars: list) -> dict:
+    """Adiciona uma lista de carros ao banco de dados em uma única transação.
+
+    Cada item deve conter brand, model, price e rating (launch_date é opcional)
+    e passa pelas mesmas validações de add_car. Retorna os índices aceitos e
+    os rejeitados, com o motivo de cada rejeição.
+    """
+    rows = []
+    accepted = []
+    rejected = []
+    for index, car in enumerate(cars):
+        try:
+            if not isinstance(car, dict):
+                raise ValueError("Cada carro deve ser um objeto JSON.")
+            if car.get('price') is None or car.get('rating') is None:
+                raise ValueError("Campos obrigatórios: brand, model, price, rating")
+            brand = car.get('brand')
+            model = car.get('model')
+            price = float(car['price'])
+            rating = float(car['rating'])
+            validate_car(brand, model, price, rating)
+        except (ValueError, TypeError) as e:
+            rejected.append({"index": index, "error": str(e)})
+            continue
+        rows.append((brand, model, price, rating, car.get('launch_date')))
+        accepted.append(index)
+
+    if rows:
+        try:
+            with pool.connection() as conn, conn, sql_timer("add_cars_batch", INSERT_CAR, f"{len(rows)} linhas"):
+                conn.executemany(INSERT_CAR, rows)
+            query_cache.bump_generation()
+        except sqlite3.Error as e:
+            metrics.record_error("add_cars_batch", e)
+            print(f"Erro no banco de dados: {e}")
+            # A transação foi desfeita: nenhum carro do lote foi gravado
+            rejected.extend({"index": index, "error": f"Erro no banco de dados: {e}"} for index in accepted)
+            rejected.sort(key=lambda item: item["index"])
+            accepted = []
+
+    return {"inserted": len(accepted), "accepted": accepted, "rejected": rejected}
+
 # Ferramenta para buscar carros por marca
-@mcp.tool()
+@tool
+@query_cache.cached
 def get_cars_by_brand(brand: str) -> list:
     """Retorna uma lista de carros de uma determinada marca."""
-    conn = sqlite3.connect("cars.db")
-    cursor = conn.execute("SELECT brand, model, price, rating, launch_date FROM cars WHERE brand = ?", (brand,))
-    cars = cursor.fetchall()
-    conn.close()
-    return [{"brand": row[0], "model": row[1], "price": row[2], "rating": row[3], "launch_date": row[4]} for row in cars]
+    with pool.connection() as conn:
+        cars = _fetch_all(conn, "get_cars_by_brand", f"SELECT {CAR_COLUMNS} FROM cars WHERE brand = ?", (brand,))
+    return _car_dicts(cars)
 
 # Ferramenta para buscar carros por modelo
-@mcp.tool()
+@tool
+@query_cache.cached
 def get_cars_by_model(model: str) -> list:
     """Retorna uma lista de carros de um determinado modelo."""
-    conn = sqlite3.connect("cars.db")
-    cursor = conn.execute("SELECT brand, model, price, rating, launch_date FROM cars WHERE model = ?", (model,))
-    cars = cursor.fetchall()
-    conn.close()
-    return [{"brand": row[0], "model": row[1], "price": row[2], "rating": row[3], "launch_date": row[4]} for row in cars]
+    with pool.connection() as conn:
+        cars = _fetch_all(conn, "get_cars_by_model", f"SELECT {CAR_COLUMNS} FROM cars WHERE model = ?", (model,))
+    return _car_dicts(cars)
 
 # Ferramenta para buscar todos os carros
-@mcp.tool()
-def get_all_cars() -> list:
-    """Retorna uma lista de todos os carros."""
-    conn = sqlite3.connect("cars.db")
-    cursor = conn.execute("SELECT brand, model, price, rating, launch_date FROM cars")
-    cars = cursor.fetchall()
-    conn.close()
-    return [{"brand": row[0], "model": row[1], "price": row[2], "rating": row[3], "launch_date": row[4]} for row in cars]
-
-@mcp.tool()
-def get_cars_filtered(brand: str = None, start_date: str = None, end_date: str = None, min_rating: float = None, limit: int = 10) -> list:
-    """Retorna uma lista de carros filtrados por marca, data de lançamento, nota mínima e limite."""
-    conn = sqlite3.connect("cars.db")
-    query = "SELECT brand, model, price, rating, launch_date FROM cars WHERE 1=1"
+@tool
+def get_all_cars(after_id: int = 0, limit: int = None) -> list:
+    """Retorna os carros em ordem de id.
+
+    Para paginar, passe limit e, nas páginas seguintes, after_id com o id do
+    último carro recebido. Sem limit, retorna todos os carros a partir de after_id.
+    """
+    with pool.connection() as conn:
+        cars = _fetch_all(conn, "get_all_cars", ALL_CARS_QUERY, (after_id, -1 if limit is None else limit))
+    return [_car_dict_with_id(row) for row in cars]
+
+def iter_all_cars(after_id: int = 0):
+    """Gera os carros um a um, lendo páginas de STREAM_FETCH_SIZE sem materializar a tabela.
+
+    Cada página usa uma conexão do pool só enquanto é lida: um cliente lento
+    não prende a conexão nem mantém uma transação de leitura aberta (o que
+    impediria os checkpoints do WAL). Carros inseridos durante o streaming,
+    com id maior que o último entregue, também aparecem.
+    """
+    while True:
+        with pool.connection() as conn:
+            rows = _fetch_all(conn, "get_all_cars", ALL_CARS_QUERY, (after_id, STREAM_FETCH_SIZE))
+        for row in rows:
+            yield _car_dict_with_id(row)
+        if len(rows) < STREAM_FETCH_SIZE:
+            break
+        after_id = rows[-1][0]
+
+def _filtered_query(brand: str, start_date: str, end_date: str, min_rating: float, limit: int) -> tuple:
+    """Monta a consulta de get_cars_filtered e seus parâmetros."""
+    query = f"SELECT {CAR_COLUMNS} FROM cars WHERE 1=1"
     params = []
     if brand:
         query += " AND brand = ?"
@@ -118,13 +336,108 @@ def get_cars_filtered(brand: str = None, start_date: str = None, end_date: str =
         params.append(min_rating)
     query += " ORDER BY rating DESC LIMIT ?"
     params.append(limit)
-    cursor = conn.execute(query, params)
-    cars = cursor.fetchall()
-    conn.close()
-    return [{"brand": row[0], "model": row[1], "price": row[2], "rating": row[3], "launch_date": row[4]} for row in cars]
+    return query, params
+
+@tool
+@query_cache.cached
+def get_cars_filtered(brand: str = None, start_date: str = None, end_date: str = None, min_rating: float = None, limit: int = 10) -> list:
+    """Retorna uma lista de carros filtrados por marca, data de lançamento, nota mínima e limite."""
+    with pool.connection() as conn:
+        if columnar_snapshot is not None and routes_to_columnar(brand, start_date, end_date):
+            cars = columnar_snapshot.filtered(conn, brand, start_date, end_date, min_rating, limit)
+            if cars is not None:
+                return cars
+        query, params = _filtered_query(brand, start_date, end_date, min_rating, limit)
+        cars = _fetch_all(conn, "get_cars_filtered", query, params)
+    return _car_dicts(cars)
+
+@tool
+@query_cache.cached
+def get_brand_stats(brand: str = None) -> list:
+    """Retorna, por marca, a quantidade de carros, o preço médio, a nota média e o histograma de notas.
+
+    Lê o resumo brand_stats, mantido por gatilhos a cada escrita em cars: o
+    custo depende do número de marcas, não do número de carros.
+    """
+    with pool.connection() as conn:
+        if brand:
+            rows = _fetch_all(conn, "get_brand_stats", BRAND_STATS_QUERY + " WHERE brand = ?", (brand,))
+        else:
+            rows = _fetch_all(conn, "get_brand_stats", BRAND_STATS_QUERY + " ORDER BY brand")
+    return [_brand_stats_dict(row) for row in rows]
+
+@tool
+@query_cache.cached
+def get_top_cars_per_brand(k: int = 3, brand: str = None) -> list:
+    """Retorna os k carros de maior nota de cada marca (ou só da marca informada), ordenados por marca."""
+    if not 1 <= k <= MAX_TOP_K:
+        raise ValueError(f"k deve estar entre 1 e {MAX_TOP_K}.")
+    cars = []
+    with pool.connection() as conn:
+        if brand:
+            brands = [brand]
+        else:
+            brands = [row[0] for row in _fetch_all(conn, "get_top_cars_per_brand(marcas)", "SELECT brand FROM brand_stats ORDER BY brand")]
+        # Uma busca por marca no índice (brand, rating): O(marcas * k)
+        for name in brands:
+            rows = _fetch_all(conn, "get_top_cars_per_brand", TOP_CARS_QUERY, (name, k))
+            cars.extend(_car_dicts(rows))
+    return cars
+
+def trigram_query(text: str) -> str:
+    """Monta a expressão MATCH do FTS5: os trigramas do texto unidos por OR.
+
+    Usa os trigramas de cada palavra e também os do texto sem espaços, para
+    que erros de OCR como "Toyot A" ainda encontrem "Toyota". Retorna '' se
+    o texto não tiver ao menos 3 letras ou dígitos seguidos.
+    """
+    words = re.findall(r"\w+", text.lower())
+    trigrams = set()
+    for word in words + ["".join(words)]:
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return " OR ".join(f'"{trigram}"' for trigram in sorted(trigrams))
+
+@tool
+@query_cache.cached
+def search_cars(query: str, limit: int = 10) -> list:
+    """Busca aproximada por marca e modelo, tolerante a erros de OCR (ex: "Corol1a").
+
+    Retorna até limit carros, do nome (marca, modelo) mais parecido para o
+    menos parecido, cada um com o campo score (maior é mais parecido).
+    """
+    if not 1 <= limit <= MAX_SEARCH_LIMIT:
+        raise ValueError(f"limit deve estar entre 1 e {MAX_SEARCH_LIMIT}.")
+    match = trigram_query(query or "")
+    if not match:
+        return []
+    cars = []
+    with pool.connection() as conn:
+        # Cada nome tem ao menos um carro: limit nomes bastam para preencher o resultado
+        names = _fetch_all(conn, "search_cars(nomes)", SEARCH_NAMES_QUERY, (match, limit))
+        for brand, model, score in names:
+            rows = _fetch_all(conn, "search_cars(carros)", SEARCH_CARS_QUERY, (model, brand, limit - len(cars)))
+            cars.extend(dict(car, score=-score) for car in _car_dicts(rows))
+            if len(cars) >= limit:
+                break
+    return cars
+
+@tool
+def get_cache_stats() -> dict:
+    """Retorna os contadores do cache de consultas (hits, misses, evictions)."""
+    return query_cache.stats()
 
 # Flask app for HTTP endpoints
 app = Flask(__name__)
+# Latência por rota e GET /metrics
+metrics.instrument_flask(app)
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout_http(e):
+    # Todas as conexões ocupadas: o cliente tenta de novo em vez de a requisição ficar presa
+    metrics.record_error("pool", e)
+    response = jsonify({"error": str(e)})
+    response.headers['Retry-After'] = "1"
+    return response, 503
 
 @app.route('/add_car', methods=['POST'])
 def add_car_http():
@@ -162,6 +475,29 @@ def add_car_with_date_http():
     add_car_with_date(brand, model, price, rating, launch_date)
     return jsonify({"message": "Car added successfully"})
 
+@app.route('/add_cars_batch', methods=['POST'])
+def add_cars_batch_http():
+    # Aceita um array JSON ou NDJSON (um carro por linha)
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        cars = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                cars.append(json.loads(line))
+            except ValueError:
+                cars.append(None)  # rejeitado pela validação do lote
+    else:
+        cars = request.get_json(silent=True)
+        if not isinstance(cars, list):
+            return jsonify({"error": "O corpo deve ser um array JSON ou NDJSON"}), 400
+
+    if len(cars) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Máximo de {MAX_BATCH_SIZE} carros por lote"}), 413
+
+    result = add_cars_batch(cars)
+    return jsonify(result)
+
 @app.route('/get_cars_by_brand', methods=['GET'])
 def get_cars_by_brand_http():
     brand = request.args.get('brand')
@@ -176,8 +512,24 @@ def get_cars_by_model_http():
 
 @app.route('/get_all_cars', methods=['GET'])
 def get_all_cars_http():
-    cars = get_all_cars()
-    return jsonify(cars)
+    try:
+        after_id = int(request.args.get('after_id', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit else None
+    except ValueError:
+        return jsonify({"error": "after_id e limit devem ser números inteiros"}), 400
+
+    # Modo streaming: um carro por linha (NDJSON), sem montar a lista inteira
+    if request.args.get('format') == 'ndjson':
+        lines = (json.dumps(car, ensure_ascii=False) + "\n" for car in iter_all_cars(after_id))
+        return Response(lines, mimetype='application/x-ndjson')
+
+    cars = get_all_cars(after_id, limit)
+    response = jsonify(cars)
+    # Página cheia: informa o cursor para buscar a próxima
+    if limit is not None and len(cars) == limit and cars:
+        response.headers['X-Next-Cursor'] = str(cars[-1]["id"])
+    return response
 
 @app.route('/get_cars_filtered', methods=['GET'])
 def get_cars_filtered_http():
@@ -192,8 +544,74 @@ def get_cars_filtered_http():
     cars = get_cars_filtered(brand, start_date, end_date, min_rating, limit)
     return jsonify(cars)
 
+@app.route('/brand_stats', methods=['GET'])
+def brand_stats_http():
+    brand = request.args.get('brand')
+    return jsonify(get_brand_stats(brand))
+
+@app.route('/top_cars_per_brand', methods=['GET'])
+def top_cars_per_brand_http():
+    brand = request.args.get('brand')
+    try:
+        k = int(request.args.get('k', 3))
+        cars = get_top_cars_per_brand(k, brand)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(cars)
+
+@app.route('/search_cars', methods=['GET'])
+def search_cars_http():
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 10))
+        cars = search_cars(query, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(cars)
+
+@app.route('/analyze_image', methods=['POST'])
+def analyze_image_http():
+    # Aceita multipart (campo "image") ou a imagem crua no corpo
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES:
+        return jsonify({"error": f"Imagem maior que {MAX_UPLOAD_BYTES} bytes"}), 413
+    upload = request.files.get('image')
+    data = upload.read() if upload else request.get_data()
+    if not data:
+        return jsonify({"error": "Envie a imagem no campo 'image' ou no corpo da requisição"}), 400
+    if len(data) > MAX_UPLOAD_BYTES:
+        return jsonify({"error": f"Imagem maior que {MAX_UPLOAD_BYTES} bytes"}), 413
+
+    path = save_upload(data, upload.filename if upload else "")
+    try:
+        job_id = image_jobs.enqueue(path)
+    except QueueFull as e:
+        os.remove(path)
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = str(QUEUE_RETRY_AFTER)
+        return response, 503
+    except sqlite3.Error as e:
+        os.remove(path)
+        metrics.record_error("analyze_image", e)
+        return jsonify({"error": f"Erro no banco de dados: {e}"}), 500
+    response = jsonify({"job_id": job_id, "status": "queued"})
+    response.headers['Location'] = f"/jobs/{job_id}"
+    return response, 202
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status_http(job_id):
+    job = image_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    del job["image_path"]
+    return jsonify(job)
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats_http():
+    return jsonify(get_cache_stats())
+
 if __name__ == "__main__":
     # Inicializa o banco de dados
     init_db()
-    print("Servidor iniciado...")
+    start_job_workers()
+    print("Servidor iniciado (modo de desenvolvimento; para produção use serve.py)...")
     app.run(host='0.0.0.0', port=8000)
@@ -0,0 +1,132 @@
+import os
+import pathlib
+import re
+import sqlite3
+import time
+
+from database import DB_PATH
+
+# Limites de execução de SQL gerado (variáveis de ambiente)
+MAX_ROWS = int(os.environ.get("SQL_MAX_ROWS", "200"))
+TIME_BUDGET = float(os.environ.get("SQL_TIME_BUDGET", "5"))  # segundos
+MAX_VM_STEPS = int(os.environ.get("SQL_MAX_VM_STEPS", "50000000"))
+FETCH_SIZE = 50
+
+# O progress handler é chamado a cada PROGRESS_INTERVAL instruções da VM do SQLite
+PROGRESS_INTERVAL = 10000
+
+# Operações permitidas pelo authorizer: apenas leitura
+_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    getattr(sqlite3, "SQLITE_RECURSIVE", 33),  # WITH RECURSIVE
+}
+
+_LEADING_COMMENTS = re.compile(r"^\s*(?:(?:--[^\n]*\n|/\*.*?\*/)\s*)*", re.DOTALL)
+
+
+class QueryRejected(Exception):
+    """O SQL não é um único SELECT somente leitura."""
+
+
+class QueryTimeout(Exception):
+    """A consulta estourou o tempo ou o número de passos da VM permitidos."""
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    return sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def check_select(sql: str) -> str:
+    """Valida que o texto é um único SELECT (ou WITH ... SELECT) e o retorna sem o ';' final."""
+    statement = sql.strip().rstrip(";").strip()
+    body = _LEADING_COMMENTS.sub("", statement)
+    if not re.match(r"(select|with)\b", body, re.IGNORECASE):
+        raise QueryRejected("Apenas consultas SELECT são permitidas.")
+    if not sqlite3.complete_statement(statement + ";"):
+        raise QueryRejected("Consulta SQL incompleta.")
+    return statement
+
+
+class GuardedQuery:
+    """Executa SQL gerado com segurança e entrega as linhas aos poucos.
+
+    O banco é aberto somente leitura (URI mode=ro), um authorizer recusa
+    qualquer operação que não seja leitura, e um progress handler interrompe
+    a consulta quando passa de time_budget segundos ou max_vm_steps passos.
+    As linhas são lidas com fetchmany e param em max_rows; nesse caso
+    truncated fica True.
+
+    Uso:
+        with GuardedQuery(sql) as query:
+            for row in query:
+                ...
+    """
+
+    def __init__(self, sql: str, db_path: str = None, max_rows: int = MAX_ROWS,
+                 time_budget: float = TIME_BUDGET, max_vm_steps: int = MAX_VM_STEPS):
+        self.sql = check_select(sql)
+        self.db_path = db_path or DB_PATH
+        self.max_rows = max_rows
+        self.time_budget = time_budget
+        self.max_vm_steps = max_vm_steps
+        self.columns = []
+        self.rows_returned = 0
+        self.truncated = False
+        self.timeout_reason = None
+        self._conn = None
+        self._cursor = None
+
+    def _progress(self) -> int:
+        self._steps += PROGRESS_INTERVAL
+        if time.monotonic() > self._deadline:
+            self.timeout_reason = f"tempo limite de {self.time_budget:g}s excedido"
+            return 1
+        if self._steps > self.max_vm_steps:
+            self.timeout_reason = f"limite de {self.max_vm_steps} passos excedido"
+            return 1
+        return 0
+
+    def __enter__(self):
+        uri = pathlib.Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        self._conn = sqlite3.connect(uri, uri=True)
+        self._conn.set_authorizer(_authorizer)
+        self._steps = 0
+        self._deadline = time.monotonic() + self.time_budget
+        self._conn.set_progress_handler(self._progress, PROGRESS_INTERVAL)
+        try:
+            self._cursor = self._conn.execute(self.sql)
+        except BaseException as e:
+            self._conn.close()
+            raise self._translate(e)
+        self.columns = [column[0] for column in self._cursor.description or ()]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.close()
+        return False
+
+    def _translate(self, error: BaseException) -> BaseException:
+        if isinstance(error, sqlite3.OperationalError) and self.timeout_reason:
+            return QueryTimeout(f"Consulta interrompida: {self.timeout_reason}.")
+        if isinstance(error, (sqlite3.Warning, sqlite3.ProgrammingError)):
+            # Python < 3.12 levanta Warning para mais de um comando; 3.12+ levanta ProgrammingError
+            return QueryRejected(f"Apenas um comando SQL por consulta: {error}")
+        if isinstance(error, sqlite3.DatabaseError) and "not authorized" in str(error):
+            return QueryRejected("A consulta tenta uma operação que não é de leitura.")
+        return error
+
+    def __iter__(self):
+        try:
+            while self.rows_returned < self.max_rows:
+                rows = self._cursor.fetchmany(min(FETCH_SIZE, self.max_rows - self.rows_returned))
+                if not rows:
+                    return
+                for row in rows:
+                    self.rows_returned += 1
+                    yield row
+            # Chegou no limite: só verifica se havia mais linhas
+            self.truncated = self._cursor.fetchone() is not None
+        except sqlite3.Error as e:
+            raise self._translate(e) from e
@@ -11,6 +11,24 @@ def test_get_all_cars():
     else:
         print("Error:", response.text)
 
+def test_get_all_cars_paginated():
+    response = requests.get(f"{SERVER_URL}/get_all_cars?limit=2&after_id=0")
+    print(f"GET /get_all_cars?limit=2: {response.status_code}")
+    if response.status_code == 200:
+        print("Response:", response.json())
+        print("X-Next-Cursor:", response.headers.get("X-Next-Cursor"))
+    else:
+        print("Error:", response.text)
+
+def test_get_all_cars_ndjson():
+    response = requests.get(f"{SERVER_URL}/get_all_cars?format=ndjson", stream=True)
+    print(f"GET /get_all_cars?format=ndjson: {response.status_code}")
+    if response.status_code == 200:
+        for line in response.iter_lines():
+            print("Line:", json.loads(line))
+    else:
+        print("Error:", response.text)
+
 def test_add_car():
     data = {
         "brand": "Toyota",
@@ -48,6 +66,19 @@ def test_add_car_with_date():
     else:
         print("Error:", response.text)
 
+def test_add_cars_batch():
+    data = [
+        {"brand": "Fiat", "model": "Uno", "price": 30000.0, "rating": 3.8},
+        {"brand": "Fiat", "model": "Palio", "price": -1, "rating": 3.5},
+        {"brand": "Ford", "model": "Ka", "price": 45000.0, "rating": 4.0, "launch_date": "2019-05-01"}
+    ]
+    response = requests.post(f"{SERVER_URL}/add_cars_batch", json=data)
+    print(f"POST /add_cars_batch: {response.status_code}")
+    if response.status_code == 200:
+        print("Response:", response.json())
+    else:
+        print("Error:", response.text)
+
 def test_get_cars_filtered():
     response = requests.get(f"{SERVER_URL}/get_cars_filtered?brand=Toyota&min_rating=4.0&limit=5")
     print(f"GET /get_cars_filtered: {response.status_code}")
@@ -56,11 +87,74 @@ def test_get_cars_filtered():
     else:
         print("Error:", response.text)
 
+def test_brand_stats():
+    response = requests.get(f"{SERVER_URL}/brand_stats")
+    print(f"GET /brand_stats: {response.status_code}")
+    if response.status_code == 200:
+        print("Response:", response.json())
+    else:
+        print("Error:", response.text)
+
+def test_top_cars_per_brand():
+    response = requests.get(f"{SERVER_URL}/top_cars_per_brand?k=3")
+    print(f"GET /top_cars_per_brand: {response.status_code}")
+    if response.status_code == 200:
+        print("Response:", response.json())
+    else:
+        print("Error:", response.text)
+
+def test_search_cars():
+    response = requests.get(f"{SERVER_URL}/search_cars?q=Corol1a&limit=5")
+    print(f"GET /search_cars: {response.status_code}")
+    if response.status_code == 200:
+        print("Response:", response.json())
+    else:
+        print("Error:", response.text)
+
+def test_metrics():
+    response = requests.get(f"{SERVER_URL}/metrics")
+    print(f"GET /metrics: {response.status_code}")
+    if response.status_code == 200:
+        print("Response:", response.text[:500])
+    else:
+        print("Error:", response.text)
+
+# Sem o prefixo test_: são passos encadeados do __main__, não testes soltos do pytest
+def submit_analyze_image():
+    # Retorna o id do job, usado por show_job_status
+    with open("metodo 1.jpeg", "rb") as f:
+        response = requests.post(f"{SERVER_URL}/analyze_image", files={"image": ("metodo 1.jpeg", f)})
+    print(f"POST /analyze_image: {response.status_code}")
+    if response.status_code == 202:
+        print("Response:", response.json())
+        print("Location:", response.headers.get("Location"))
+        return response.json()["job_id"]
+    print("Error:", response.text)
+    return None
+
+def show_job_status(job_id):
+    if job_id is None:
+        return
+    response = requests.get(f"{SERVER_URL}/jobs/{job_id}")
+    print(f"GET /jobs/{job_id}: {response.status_code}")
+    if response.status_code == 200:
+        print("Response:", response.json())
+    else:
+        print("Error:", response.text)
+
 if __name__ == "__main__":
     print("Testing endpoints...")
     test_get_all_cars()
+    test_get_all_cars_paginated()
+    test_get_all_cars_ndjson()
     test_add_car()
     test_get_cars_by_brand()
     test_add_car_with_date()
+    test_add_cars_batch()
     test_get_cars_filtered()
+    test_brand_stats()
+    test_top_cars_per_brand()
+    test_search_cars()
+    test_metrics()
+    show_job_status(submit_analyze_image())
     print("Testing completed.")
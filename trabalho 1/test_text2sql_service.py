@@ -0,0 +1,108 @@
+"""Testes do Text2SQLBatcher com uma função de geração falsa (não carrega o modelo).
+
+Uso:
+    python -m pytest test_text2sql_service.py
+"""
+import threading
+
+import pytest
+
+from text2sql_service import Text2SQLBatcher
+
+
+def make_batcher(generate_fn, max_batch_size=8, max_wait_ms=200):
+    return Text2SQLBatcher(generate_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+
+def submit_together(batcher, prompts):
+    # Envia todos os prompts de uma vez para caírem no mesmo lote
+    return [batcher.submit(prompt) for prompt in prompts]
+
+
+def test_results_follow_prompt_order():
+    calls = []
+
+    def generate(prompts):
+        calls.append(list(prompts))
+        return [f"SELECT '{prompt}';" for prompt in prompts]
+
+    batcher = make_batcher(generate)
+    try:
+        prompts = [f"pergunta {i}" for i in range(5)]
+        futures = submit_together(batcher, prompts)
+        assert [future.result(timeout=5) for future in futures] == [f"SELECT '{p}';" for p in prompts]
+    finally:
+        batcher.close()
+    assert calls == [prompts]
+    assert batcher.batches == 1 and batcher.prompts == 5
+
+
+def test_batches_are_split_at_max_batch_size():
+    sizes = []
+
+    def generate(prompts):
+        sizes.append(len(prompts))
+        return [prompt.upper() for prompt in prompts]
+
+    batcher = make_batcher(generate, max_batch_size=2)
+    try:
+        futures = submit_together(batcher, ["a", "b", "c"])
+        assert [future.result(timeout=5) for future in futures] == ["A", "B", "C"]
+    finally:
+        batcher.close()
+    assert sizes == [2, 1]
+
+
+def test_generate_exception_reaches_every_caller():
+    def generate(prompts):
+        raise RuntimeError("modelo indisponível")
+
+    batcher = make_batcher(generate)
+    try:
+        futures = submit_together(batcher, ["a", "b"])
+        for future in futures:
+            with pytest.raises(RuntimeError, match="modelo indisponível"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+    assert batcher.batches == 0
+
+
+def test_missing_results_fail_the_whole_batch():
+    def generate(prompts):
+        return ["SELECT 1;"] * (len(prompts) - 1)
+
+    batcher = make_batcher(generate)
+    try:
+        futures = submit_together(batcher, ["a", "b", "c"])
+        for future in futures:
+            with pytest.raises(RuntimeError, match="2 resultado"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_batcher_keeps_working_after_a_failed_batch():
+    fail = threading.Event()
+    fail.set()
+
+    def generate(prompts):
+        if fail.is_set():
+            fail.clear()
+            raise RuntimeError("falha passageira")
+        return [f"ok {prompt}" for prompt in prompts]
+
+    batcher = make_batcher(generate, max_wait_ms=0)
+    try:
+        with pytest.raises(RuntimeError):
+            batcher.text_to_sql("a", timeout=5)
+        assert batcher.text_to_sql("b", timeout=5) == "ok b"
+    finally:
+        batcher.close()
+
+
+def test_submit_after_close_is_rejected():
+    batcher = make_batcher(lambda prompts: list(prompts))
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit("a")
@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import Flask, request, jsonify
+
+import carregararctic
+import metrics
+
+# Configuração (variáveis de ambiente)
+MAX_BATCH_SIZE = int(os.environ.get("TEXT2SQL_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.environ.get("TEXT2SQL_MAX_WAIT_MS", "20"))
+SERVICE_PORT = int(os.environ.get("TEXT2SQL_PORT", "8001"))
+
+
+class Text2SQLBatcher:
+    """Junta prompts concorrentes em lotes para uma única chamada de geração.
+
+    Cada submit() entra em uma fila; uma thread de fundo pega o primeiro
+    prompt, espera até max_wait_ms por outros (até max_batch_size), chama
+    generate_fn uma vez com o lote e devolve cada resultado ao Future de
+    quem o enviou. Se generate_fn falhar ou não devolver exatamente um
+    resultado por prompt, todos os Futures do lote recebem a exceção.
+    """
+
+    def __init__(self, generate_fn=None, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.generate_fn = generate_fn or carregararctic.generate_sql_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.prompts = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._loop, name="text2sql-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: str) -> Future:
+        if self._closed:
+            raise RuntimeError("Serviço Text2SQL encerrado.")
+        future = Future()
+        self._queue.put((prompt, future))
+        return future
+
+    def text_to_sql(self, prompt: str, timeout: float = None) -> str:
+        """Versão bloqueante: envia o prompt e espera o SQL do seu lote."""
+        return self.submit(prompt).result(timeout)
+
+    def _next_batch(self) -> list:
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Encerramento: processa o lote atual e depois para
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            # Quem desistiu (Future cancelado) não ocupa lugar no lote
+            batch = [(prompt, future) for prompt, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = list(self.generate_fn([prompt for prompt, _ in batch]))
+                if len(results) != len(batch):
+                    # Sem um resultado por prompt não dá para saber qual SQL é de quem
+                    raise RuntimeError(f"generate_fn devolveu {len(results)} resultado(s) para {len(batch)} prompt(s).")
+            except Exception as e:
+                metrics.record_error("text2sql_batch", e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.prompts += len(batch)
+            batch_size_histogram.observe(len(batch))
+            for (_, future), sql in zip(batch, results):
+                future.set_result(sql)
+
+    def close(self):
+        """Termina os lotes pendentes e para a thread de fundo."""
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+
+# Serviço HTTP compartilhado por várias sessões do chatbot
+app = Flask(__name__)
+metrics.instrument_flask(app)
+batcher = None
+
+batch_size_histogram = metrics.registry.histogram(
+    "cars_text2sql_batch_size", "Prompts por chamada de geração.", buckets=(1, 2, 4, 8, 16, 32))
+
+
+@app.route('/text_to_sql', methods=['POST'])
+def text_to_sql_http():
+    data = request.get_json(silent=True) or {}
+    prompt = data.get('prompt')
+    if not prompt:
+        return jsonify({"error": "Campo obrigatório: prompt"}), 400
+    try:
+        sql = batcher.text_to_sql(prompt)
+    except Exception as e:
+        return jsonify({"error": f"Erro ao gerar SQL: {str(e)}"}), 500
+    return jsonify({"sql": sql})
+
+
+@app.route('/stats', methods=['GET'])
+def stats_http():
+    average = batcher.prompts / batcher.batches if batcher.batches else 0.0
+    return jsonify({"batches": batcher.batches, "prompts": batcher.prompts, "average_batch_size": average})
+
+
+if __name__ == "__main__":
+    carregararctic.load_model()
+    batcher = Text2SQLBatcher()
+    print(f"Serviço Text2SQL iniciado (lotes de até {MAX_BATCH_SIZE}, espera de {MAX_WAIT_MS} ms)...")
+    app.run(host='0.0.0.0', port=SERVICE_PORT, threaded=True)
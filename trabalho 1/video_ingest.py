@@ -0,0 +1,192 @@
+"""Análise de vídeos e sequências de fotos (burst) de pátios de carros.
+
+Quadros vizinhos de um vídeo são quase idênticos: rodar o OCR em todos
+repetiria o mesmo texto milhares de vezes. Aqui cada quadro amostrado
+recebe um hash perceptual (dHash de 64 bits); quadros a até
+VIDEO_HASH_DISTANCE bits de um quadro já analisado são descartados, assim
+como os borrados (variância do Laplaciano abaixo de VIDEO_MIN_SHARPNESS).
+Só os quadros distintos e nítidos passam pelo ImagePipeline, direto do
+array do quadro, e os carros encontrados são devolvidos para entrar em
+um único lote.
+
+Uso:
+    python video_ingest.py <vídeo ou pasta de fotos> [--frame-step 3] [--max-distance 10] [--min-sharpness 100] [--dry-run]
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from image_processing import get_pipeline, list_images, parse_car_text, record_ocr_metrics
+
+# Configuração (variáveis de ambiente)
+# Analisa um a cada N quadros do vídeo (os demais são pulados sem decodificar)
+VIDEO_FRAME_STEP = int(os.environ.get("VIDEO_FRAME_STEP", "3"))
+# Distância de Hamming (em bits, de 64) até a qual um quadro é considerado repetido
+VIDEO_HASH_DISTANCE = int(os.environ.get("VIDEO_HASH_DISTANCE", "10"))
+# Variância do Laplaciano mínima para o quadro ir para o OCR (quadros borrados ficam de fora)
+VIDEO_MIN_SHARPNESS = float(os.environ.get("VIDEO_MIN_SHARPNESS", "100"))
+
+# Lado (px) do quadro reduzido usado para medir a nitidez: o limite não depende da resolução do vídeo
+SHARPNESS_WIDTH = 640
+
+# Valores que parse_car_text usa quando não encontra marca nem modelo no texto
+UNKNOWN_BRAND, UNKNOWN_MODEL = "Desconhecida", "Desconhecido"
+
+video_frames = metrics.registry.counter(
+    "cars_video_frames_total", "Quadros de vídeo/burst por destino (duplicate, blurry, ocr).")
+
+
+def dhash(gray) -> int:
+    """Hash perceptual de 64 bits: compara cada pixel com o vizinho à direita em uma miniatura 9x8."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def sharpness(gray) -> float:
+    """Variância do Laplaciano, medida em uma cópia com largura SHARPNESS_WIDTH."""
+    height, width = gray.shape[:2]
+    if width > SHARPNESS_WIDTH:
+        gray = cv2.resize(gray, (SHARPNESS_WIDTH, height * SHARPNESS_WIDTH // width), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def check_frame_step(frame_step: int):
+    """frame_step é 1 (todos os quadros) ou mais; 0 ou negativo não faz sentido como passo."""
+    if frame_step < 1:
+        raise ValueError(f"frame_step deve ser 1 ou mais (recebido {frame_step}); confira VIDEO_FRAME_STEP/--frame-step")
+
+
+def iter_frames(source: str, frame_step: int = VIDEO_FRAME_STEP):
+    """Gera (número do quadro, quadro BGR) de um vídeo ou de uma pasta de fotos.
+
+    No vídeo, só um a cada frame_step quadros é decodificado (grab/retrieve);
+    os demais vêm com quadro None, só para a contagem. Numa pasta, todas as
+    fotos são lidas, em ordem alfabética (None nas que não abrirem).
+    """
+    check_frame_step(frame_step)
+    if os.path.isdir(source):
+        for index, path in enumerate(list_images(source)):
+            yield index, cv2.imread(path)
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Vídeo não pôde ser aberto: {source}")
+    try:
+        index = 0
+        while capture.grab():
+            frame = None
+            if index % frame_step == 0:
+                ok, frame = capture.retrieve()
+            yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def analyze_frame(gray) -> tuple:
+    """Roda o pipeline de OCR em um quadro em tons de cinza e retorna (marca, modelo, preço, nota)."""
+    timings = {}
+    text = get_pipeline().run(gray, timings)
+    start = time.perf_counter()
+    result = parse_car_text(text)
+    timings["parse"] = (time.perf_counter() - start) * 1000
+    record_ocr_metrics(timings, cached=False)
+    return result
+
+
+def ingest(source: str, frame_step: int = VIDEO_FRAME_STEP, max_distance: int = VIDEO_HASH_DISTANCE,
+           min_sharpness: float = VIDEO_MIN_SHARPNESS) -> dict:
+    """Analisa um vídeo ou uma pasta de fotos e retorna o relatório com os carros encontrados.
+
+    Chaves: frames_read (quadros do vídeo ou fotos da pasta), frames_sampled
+    (decodificados), duplicates, blurry, frames_ocr, failed_frames, cars
+    (dicionários prontos para add_cars_batch, sem repetições) e seconds.
+    """
+    check_frame_step(frame_step)
+    start = time.perf_counter()
+    report = {"frames_read": 0, "frames_sampled": 0, "duplicates": 0, "blurry": 0, "frames_ocr": 0,
+              "failed_frames": [], "cars": []}
+    # Hashes dos quadros que já passaram pelo OCR
+    seen = []
+    found = set()
+    for index, frame in iter_frames(source, frame_step):
+        report["frames_read"] += 1
+        if frame is None:
+            continue
+        report["frames_sampled"] += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        frame_hash = dhash(gray)
+        if any(hamming(frame_hash, other) <= max_distance for other in seen):
+            report["duplicates"] += 1
+            video_frames.inc(outcome="duplicate")
+            continue
+        # Quadro borrado não entra em seen: uma versão nítida da mesma cena ainda é analisada
+        if sharpness(gray) < min_sharpness:
+            report["blurry"] += 1
+            video_frames.inc(outcome="blurry")
+            continue
+
+        seen.append(frame_hash)
+        report["frames_ocr"] += 1
+        video_frames.inc(outcome="ocr")
+        try:
+            brand, model, price, rating = analyze_frame(gray)
+        except Exception as e:
+            metrics.record_error("video_ingest", e)
+            report["failed_frames"].append({"frame": index, "error": f"{type(e).__name__}: {e}"})
+            continue
+        # Quadros sem texto de anúncio viram só os valores padrão do parsing
+        if brand == UNKNOWN_BRAND and model == UNKNOWN_MODEL:
+            continue
+        # O mesmo carro aparece em vários ângulos distintos: entra uma vez só
+        key = (brand, model, price, rating)
+        if key not in found:
+            found.add(key)
+            report["cars"].append({"brand": brand, "model": model, "price": price, "rating": rating})
+
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def print_report(report: dict):
+    print(f"{report['frames_read']} quadro(s) lido(s), {report['frames_sampled']} amostrado(s), "
+          f"{report['frames_ocr']} com OCR ({report['duplicates']} repetido(s), {report['blurry']} borrado(s)) "
+          f"em {report['seconds']:.1f} s")
+    for failure in report["failed_frames"]:
+        print(f"  ✗ quadro {failure['frame']}: {failure['error']}")
+    for car in report["cars"]:
+        print(f"  ✓ {car['brand']} {car['model']}, R${car['price']}, nota {car['rating']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="arquivo de vídeo ou pasta com as fotos do burst")
+    parser.add_argument("--frame-step", type=int, default=VIDEO_FRAME_STEP)
+    parser.add_argument("--max-distance", type=int, default=VIDEO_HASH_DISTANCE)
+    parser.add_argument("--min-sharpness", type=float, default=VIDEO_MIN_SHARPNESS)
+    parser.add_argument("--dry-run", action="store_true", help="só mostra o relatório, sem enviar os carros ao servidor")
+    args = parser.parse_args()
+    if args.frame_step < 1:
+        parser.error("--frame-step deve ser 1 ou mais")
+
+    report = ingest(args.source, args.frame_step, args.max_distance, args.min_sharpness)
+    print_report(report)
+    if report["cars"] and not args.dry_run:
+        import mcp_client
+        result = mcp_client.add_cars_batch(report["cars"])
+        print(f"{result['inserted']} carro(s) adicionado(s), {len(result['rejected'])} rejeitado(s).")
+
+
+if __name__ == "__main__":
+    main()